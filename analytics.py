@@ -0,0 +1,140 @@
+import csv
+import functools
+
+import numpy as np
+
+# Rows of the dataset that are aggregates themselves, left out of the built-in groups
+AGGREGATE_CODES = ('OWID_WRL',)
+
+ALL_COUNTRIES = 'All countries'
+INCOME_QUARTILES = (
+    'Income quartile 1 (highest)',
+    'Income quartile 2',
+    'Income quartile 3',
+    'Income quartile 4 (lowest)',
+)
+
+
+def load_groups(path):
+    # Group definitions from a CSV file with "Group" and "Country Code" columns, one member per line
+    groups = {}
+    with open(path, newline='') as f:
+        for line in csv.DictReader(f):
+            groups.setdefault(line['Group'], []).append(line['Country Code'])
+    return groups
+
+
+def load_weights(path, store):
+    # Country x year weights (e.g. population) from a CSV with the schema of the GDP file,
+    # aligned with the store's rows and years; countries or years it lacks are NaN
+    import pandas as pd
+    frame = pd.read_csv(path).set_index('Country Code')
+    weights = np.full(store.values.shape, np.nan)
+    years = [j for j, year in enumerate(store.years) if year in frame.columns]
+    frame = frame.reindex(store.codes)[[store.years[j] for j in years]]
+    weights[:, years] = frame.to_numpy(dtype=np.float64)
+    return weights
+
+
+class QueryEngine:
+    """Group aggregates and year-range growth over one version of the dataset.
+
+    Group memberships are kept as a 0/1 matrix, so the yearly totals of every
+    group come from one matrix product. Along the year axis, prefix sums of
+    those totals and prefix sums of the groups' log growth factors (prefix
+    log-products) turn the mean or growth over any year range into the
+    difference of two columns. Results are memoized; an engine belongs to a
+    single dataset version.
+    """
+
+    def __init__(self, store, groups=None, weights=None, cache_size=256):
+        self.store = store
+        self.groups = self._builtin_groups()
+        for name, members in (groups or {}).items():
+            self.groups[name] = store.rows(members)
+        self.group_names = list(self.groups)
+        self.group_index = {name: i for i, name in enumerate(self.group_names)}
+        self.membership = np.zeros((len(self.groups), len(store.countries)))
+        for i, rows in enumerate(self.groups.values()):
+            self.membership[i, rows] = 1
+
+        valid = ~np.isnan(store.values)
+        self._prefixes = {'mean': self._prefix_sums(valid, np.ones(store.values.shape))}
+        if weights is not None:
+            self._prefixes['weighted'] = self._prefix_sums(valid & ~np.isnan(weights), weights)
+
+        self.compare = functools.lru_cache(maxsize=cache_size)(self._compare)
+        self.growth_ranking = functools.lru_cache(maxsize=cache_size)(self._growth_ranking)
+
+    @property
+    def weighted(self):
+        return 'weighted' in self._prefixes
+
+    def _builtin_groups(self):
+        # All countries and quartiles of the latest year's GDP per capita
+        store = self.store
+        countries = np.flatnonzero(~np.isin(store.codes, AGGREGATE_CODES))
+        groups = {ALL_COUNTRIES: countries}
+        latest = store.order[:, -1]
+        ranked = latest[np.isin(latest, countries) & ~np.isnan(store.values[latest, -1])]
+        for name, rows in zip(INCOME_QUARTILES, np.array_split(ranked, len(INCOME_QUARTILES))):
+            groups[name] = np.sort(rows)
+        return groups
+
+    def _prefix_sums(self, valid, weights):
+        # Per group: prefix sums of the weighted yearly totals and of the weights (for range means),
+        # and prefix sums of the log yearly growth factors with the count of years they cover
+        levels = np.where(valid, self.store.values, 0) * np.where(valid, weights, 0)
+        weights = np.where(valid, weights, 0)
+        totals, denominators = self.membership @ levels, self.membership @ weights
+
+        # Chain-linked growth: each year compares the members with a value in both years
+        both = valid[:, 1:] & valid[:, :-1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_factors = (
+                np.log(self.membership @ (levels[:, 1:] * both)) - np.log(self.membership @ (weights[:, 1:] * both))
+                - np.log(self.membership @ (levels[:, :-1] * both)) + np.log(self.membership @ (weights[:, :-1] * both))
+            )
+        covered = np.isfinite(log_factors)
+
+        def prefix(matrix):
+            return np.concatenate([np.zeros((len(matrix), 1)), np.cumsum(matrix, axis=1)], axis=1)
+
+        return {
+            'totals': prefix(totals),
+            'denominators': prefix(denominators),
+            'log_growth': prefix(np.where(covered, log_factors, 0)),
+            'covered': prefix(covered),
+        }
+
+    def _compare(self, groups, start, end, measure='level', weighting='mean'):
+        # One value per group for the years start..end (inclusive): the mean GDP per capita,
+        # or the growth of the group mean between start and end (total or annualized), in percent
+        a, b = sorted((self.store.col(start), self.store.col(end)))
+        rows = [self.group_index[group] for group in groups]
+        prefixes = self._prefixes[weighting]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if measure == 'level':
+                totals = prefixes['totals'][rows, b + 1] - prefixes['totals'][rows, a]
+                result = totals / (prefixes['denominators'][rows, b + 1] - prefixes['denominators'][rows, a])
+            else:
+                log_growth = prefixes['log_growth'][rows, b] - prefixes['log_growth'][rows, a]
+                log_growth[prefixes['covered'][rows, b] - prefixes['covered'][rows, a] < b - a] = np.nan
+                if measure == 'cagr':
+                    # Annualized over the time between the periods, which need not be one column apart
+                    years = self.store.positions[b] - self.store.positions[a]
+                    log_growth /= years if years > 0 else 1
+                result = np.expm1(log_growth) * 100
+        result.setflags(write=False)  # shared by every caller through the memo
+        return result
+
+    def _growth_ranking(self, group, start, end, n=15):
+        # Members of a group with the highest compound annual growth between two years, as (rows, percent)
+        rows = self.groups[group]
+        cagr = self.store.cagr(start, end)[rows]
+        order = np.argsort(-cagr, kind='stable')
+        order = order[~np.isnan(cagr[order])][:n]
+        rows, cagr = rows[order], cagr[order]
+        for result in (rows, cagr):
+            result.setflags(write=False)  # shared by every caller through the memo
+        return rows, cagr
@@ -1,345 +1,750 @@
-import pandas as pd
 import dash
 from dash import dcc
 from dash import html
-from dash.dependencies import Input, Output
-import plotly.express as px
+from dash.dependencies import Input, Output, State, ClientsideFunction
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
+from plotly.colors import qualitative
+import numpy as np
+import hashlib
+import hmac
+import os
+import warnings
+from flask import Response, jsonify, request
+from data_store import LiveStore
+from analytics import QueryEngine, load_groups, load_weights, ALL_COUNTRIES, INCOME_QUARTILES
+from figure_cache import FigureCache, SQLiteCache, register_metrics
+from coalesce import SingleFlight
+import metrics
+import compact
+
+DATA_FILE = os.environ.get('GDP_DATA_FILE', 'gdp_per_capita_1990_2020.csv')
+
+# Columnar country x year matrix used by the callbacks (missing values stay NaN).
+# The binary store written by ingest.py is memory-mapped; the CSV is parsed only if it is missing or stale.
+# A parsed CSV is saved as that store (the startup snapshot) unless DATA_SNAPSHOT=0.
+# A changed file is loaded next to the current version and swapped in atomically (see data_store.LiveStore),
+# so every callback works on one version: the figure cache takes live_store.current once per call and passes it in.
+live_store = LiveStore(DATA_FILE, snapshot=os.environ.get('DATA_SNAPSHOT', '1') != '0')
+
+# With DATA_WATCH_INTERVAL set (seconds), every process polls the data file and reloads it when it changes
+DATA_WATCH_INTERVAL = float(os.environ.get('DATA_WATCH_INTERVAL', 0))
+
+# With ADMIN_TOKEN set, POST /admin/reload (header "X-Admin-Token: <token>") reloads the data file
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+# With CLIENTSIDE_SLIDER=1 the year slider is handled in the browser and covers every year of the dataset
+CLIENTSIDE_SLIDER = os.environ.get('CLIENTSIDE_SLIDER', '') not in ('', '0')
+
+# Define the years to include in the year slider; in clientside mode they follow the dataset version
+SERVER_SLIDER_YEARS = [1990, 1994, 1998, 2002, 2006, 2010, 2014, 2018, 2020]
+
+
+def slider_years(store):
+    if CLIENTSIDE_SLIDER:
+        return [int(year) for year in store.years]
+    return SERVER_SLIDER_YEARS
+
+
+# Create the marks dictionary for the year slider (every fifth year when all years are included)
+def slider_marks(years):
+    return {
+        i: str(year) for i, year in enumerate(years)
+        if not CLIENTSIDE_SLIDER or year % 5 == 0 or i == len(years) - 1
+    }
+
+# Rows per page offered for the ranking table
+table_page_sizes = [10, 25, 50, 100]
+
+# Group comparisons: groups beyond the built-in ones come from COUNTRY_GROUPS_FILE ("Group" and
+# "Country Code" columns); POPULATION_FILE (the GDP file's schema) enables population-weighted means
+COUNTRY_GROUPS_FILE = os.environ.get('COUNTRY_GROUPS_FILE')
+POPULATION_FILE = os.environ.get('POPULATION_FILE')
+group_measures = [
+    {'label': 'Mean GDP per capita', 'value': 'level'},
+    {'label': 'Growth between the years', 'value': 'growth'},
+    {'label': 'Annual growth (CAGR)', 'value': 'cagr'},
+]
+
+# Query engine of each dataset version, built on first use
+_engines = {}
+
+
+def analytics_engine(store):
+    engine = _engines.get(store.version)
+    if engine is None:
+        _engines.clear()
+        engine = _engines[store.version] = QueryEngine(
+            store,
+            groups=load_groups(COUNTRY_GROUPS_FILE) if COUNTRY_GROUPS_FILE else None,
+            weights=load_weights(POPULATION_FILE, store) if POPULATION_FILE else None,
+        )
+    return engine
+
+# Modules and settings that change what the callbacks render
+RENDER_SOURCES = ('app.py', 'analytics.py', 'compact.py', 'data_store.py')
+RENDER_SETTINGS = ('COMPACT_PAYLOADS', 'COMPACT_BINARY_ARRAYS', 'AGGREGATE_THRESHOLD', 'CLIENTSIDE_SLIDER',
+                   'COUNTRY_GROUPS_FILE', 'POPULATION_FILE')
+
+
+def render_fingerprint():
+    # Hash of the rendering code, library versions and settings (including the contents of setting files)
+    import plotly
+    digest = hashlib.sha1(f'{dash.__version__} {plotly.__version__}'.encode())
+    root = os.path.dirname(os.path.abspath(__file__))
+    for name in RENDER_SOURCES:
+        with open(os.path.join(root, name), 'rb') as f:
+            digest.update(f.read())
+    for name in RENDER_SETTINGS:
+        value = os.environ.get(name, '')
+        digest.update(f'{name}={value}\n'.encode())
+        if name.endswith('_FILE') and value:
+            with open(value, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+# Cache of serialized callback outputs, keyed by callback, inputs and dataset version.
+# With FIGURE_CACHE_DB set, worker processes also share a SQLite cache file; its keys also carry
+# the render fingerprint, so a deploy or settings change never serves figures from the file.
+# Identical concurrent misses are computed once; with COALESCE_LOCK_DIR set, also across workers.
+figure_cache = FigureCache(
+    live_store,
+    maxsize=int(os.environ.get('FIGURE_CACHE_SIZE', 128)),
+    shared=SQLiteCache(os.environ['FIGURE_CACHE_DB']) if os.environ.get('FIGURE_CACHE_DB') else None,
+    flight=SingleFlight(lock_dir=os.environ.get('COALESCE_LOCK_DIR')),
+    fingerprint=render_fingerprint(),
+)
+
+# Create the Dash app
+# Callback responses are gzip/brotli compressed for clients that accept it
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.MINTY], compress=True)
 
-# Load the CSV file into a pandas DataFrame
-data = pd.read_csv('gdp_per_capita_1990_2020.csv')
+# WSGI entry point for production servers (see serve.py)
+server = app.server
 
 
+# Expose the figure cache hit/miss counters
+@app.server.route('/cache-stats')
+def cache_stats():
+    return jsonify(figure_cache.stats())
 
-# Convert NaN values to 0
-data = data.fillna(0)
 
-# Get the list of unique countries
-countries = data['Country '].unique()
+# Callback timings, payload sizes and cache counters in the Prometheus text format.
+# With METRICS_DIR set, every worker process writes its values there and /metrics reports their sum.
+register_metrics(figure_cache, metrics.registry)
+if os.environ.get('METRICS_DIR'):
+    metrics.registry.share(os.environ['METRICS_DIR'])
 
-# Define the years to include in the year slider
-included_years = [1990, 1994, 1998, 2002, 2006, 2010, 2014, 2018, 2020]
 
-# Create the marks dictionary for the year slider
-marks = {i: str(year) for i, year in enumerate(included_years)}
+@app.server.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
 
-# Create the Dash app
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.MINTY])
+
+# Collapsed stacks of the latest profiled callbacks (DASH_PROFILING=1 and an "X-Profile: 1" request header)
+@app.server.route('/metrics/profiles')
+def callback_profiles():
+    return Response(metrics.render_profiles(), mimetype='text/plain')
+
+
+# The watcher and metrics writer threads have to be started in each worker process, after gunicorn forks them
+@app.server.before_request
+def start_worker_threads():
+    if DATA_WATCH_INTERVAL > 0:
+        live_store.watch(DATA_WATCH_INTERVAL)
+    metrics.registry.start()
+
+
+# Reload the data file in the process that receives the request; with several
+# workers, use DATA_WATCH_INTERVAL so that every worker picks up the change
+@app.server.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    if not ADMIN_TOKEN or not hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), ADMIN_TOKEN.encode()):
+        return jsonify({'error': 'forbidden'}), 403
+    changes = live_store.reload()
+    return jsonify({
+        'version': live_store.current.version,
+        'changed': changes is not None,
+        'years': sorted(changes.years) if changes else [],
+        'countries': sorted(changes.countries) if changes else [],
+    })
 
 #-------------***** Application Layout *****-----------------
 
-# Define the app layout
-app.layout = dbc.Container(
-    style={'font-family': 'Arial, sans-serif', 'padding': '30px'},
-    fluid=True,
-    children=[
-        dbc.Row(
-            className='align-items-start',
-            children=[
-                dbc.Col(
-                    className='col-8',
-                    children=[
-                        html.H2("World GDP per Capita Dashboard", style={'text-align': 'center', 'color': 'black'}),
-                        html.H4("Visualizing Global Economic Growth from 1990 to 2020", style={'text-align': 'center', 'color': 'black'}),
-                        html.P(
-                            """Visualize the growth of world GDP per capita from 1990 to 2020 through this interactive dashboard. 
-                            Explore the percentage growth in GDP per capita for each country, as represented on a choropleth map. 
-                            Gain insights into global economic trends and the impact on living standards worldwide. 
-                            Analyze the development of GDP per capita over time using line charts, compare countries using bar charts, 
-                            and explore the growth rate and top-ranking countries for a comprehensive understanding of 
-                            global economic dynamics.""",
-                            style={'text-align': 'justify', 'padding': '20px', 'font-family': 'Calibri'}
-                        ),
-                        dbc.Container(
-                            className='slider-container',
-                            children=[
-                                dcc.Slider(
-                                    id='year-slider',
-                                    min=0,
-                                    max=len(included_years) - 1,
-                                    value=0,
-                                    marks=marks,
-                                    step=1,
-                                    className='slider'
-                                )
-                            ],
-                            fluid=True,
-                            style={'padding': '20px'}
-                        ),
-                        dbc.Row(
-                            children=[
-                                dbc.Col(
-                                    className='col-8',
-                                    children=[
-                                        html.H3(
-                                            id='title',
-                                            style={'text-align': 'center', 'margin-top': '10px', 'color': 'black'}
-                                        ),
-                                        dcc.Graph(id='choropleth-graph'),
-                                    ],
-                                    align='top',
-                                    width=8
-                                ),
-                                dbc.Col(
-                                    className='col-4',
-                                    children=[
-                                        html.H5("Top Countries with Highest GDP per Capita", style={'text-align': 'left', 'color': 'black'}),
-                                        html.Div(id='gdp-table'),
-                                    ],
-                                    align='top',
-                                    width=4
-                                ),
-                            ],
-                            style={'padding': '20px'}
-                        ),
-                        dbc.Row(
-                            children=[
-                                dbc.Col(
-                                    className='col-3',
-                                    children=[
-                                        html.H4("Progression Analysis", style={'text-align': 'left', 'color': 'black'}),
-                                        html.H6("Comparative Evolution of Selected Countries Over Time: 1990-2020", style={'text-align': 'left', 'color': 'black'}),
-                                        html.P(
-                                            """This line chart showcases the development of GDP per capita from 1990 to 2020. 
-                                            Explore the changes in economic prosperity over time as countries progress and evolve. 
-                                            By selecting specific countries, you can compare their individual growth trajectories 
-                                            and gain insights into the factors influencing their GDP per capita. 
-                                            Observe trends, fluctuations, and significant milestones as you analyze the dynamic 
-                                            nature of economic development across nations. Discover the story behind GDP per capita 
-                                            and its impact on countries' standards of living and overall economic well-being.""",
-                                            style={'text-align': 'justify', 'padding': '5px', 'font-family': 'Calibri'}
-                                        ),
-                                    ],
-                                    align='top',
-                                    width=3
-                                ),
-                                dbc.Col(
-                                    className='col-9',
-                                    children=[
-                                        html.H4("Line Chart", style={'text-align': 'left', 'color': 'black'}),
-                                        dcc.Dropdown(
-                                            id='country-dropdown-line',
-                                            options=[{'label': country, 'value': country} for country in countries],
-                                            value=['Germany', 'United States', 'China'],  # Default selected countries
-                                            multi=True
-                                        ),
-                                        dcc.Graph(id='line-chart'),
-                                    ],
-                                    align='center',
-                                    width=9
-                                ),
-                            ],
-                            style={'padding': '20px'}
-                        ),
-                        dbc.Row(
-                            children=[
-                                dbc.Col(
-                                    className='col-9',
-                                    children=[
-                                        html.H4("Bar Chart", style={'text-align': 'left', 'color': 'black'}),
-                                        dcc.Dropdown(
-                                            id='country-dropdown-bar',
-                                            options=[{'label': country, 'value': country} for country in countries],
-                                            value=['Germany', 'United States', 'China'],  # Default selected countries
-                                            multi=True
-                                        ),
-                                        dcc.Dropdown(
-                                            id='year-dropdown-bar',
-                                            options=[{'label': year, 'value': year} for year in data.columns[2:]],
-                                            value=data.columns[-1],  # Set default value to the last year 2018
-                                            multi=False
-                                        ),
-                                        dcc.Graph(id='bar-chart'),
-                                    ],
-                                    align='center',
-                                    width=9
-                                ),
-                                dbc.Col(
-                                    className='col-3',
-                                    children=[
-                                        html.H4("Comparison Analysis", style={'text-align': 'left', 'color': 'black'}),
-                                        html.H6("Comparative Analysis of Selected Countries for a Specific Year", style={'text-align': 'left', 'color': 'black'}),
-                                        html.P(
-                                            """In this part of the dashboard, you can select multiple countries of your choice and choose 
-                                            a particular year to perform a GDP per capita analysis. The results will 
-                                            be displayed in ascending order, with the country having a higher GDP per capita appearing at the top of the list. 
-                                            This allows you to compare the economic performance of different countries 
-                                            and gain insights into their relative prosperity.""",
-                                            style={'text-align': 'justify', 'padding': '5px', 'font-family': 'Calibri'}
-                                        ),
-                                    ],
-                                    align='top',
-                                    width=3
-                                ),
-                            ],
-                            style={'padding': '20px'}
-                        ),
-                        dbc.Row(
-                            children=[
-                                dbc.Col(
-                                    className='col-3',
-                                    children=[
-                                        html.H4("Growth Rate Analysis", style={'text-align': 'left', 'color': 'black'}),
-                                        html.H6("Analyzing the Annual Percentage Growth of GDP per Capita (%)", style={'text-align': 'left', 'color': 'black'}),
-                                        html.P(
-                                            """Explore the GDP growth rate percentage analysis to understand the dynamic changes in 
-                                            economic performance across countries. This visualization showcases the annual growth 
-                                            rates of GDP from 1990 to 2020, providing insights into the speed and direction of 
-                                            economic expansion. Compare the growth rates of different countries and uncover trends, 
-                                            fluctuations, and significant milestones. Gain a deeper understanding of the factors 
-                                            driving economic growth and the implications for countries' development and prosperity.""",
-                                            style={'text-align': 'justify', 'padding': '5px', 'font-family': 'Calibri'}
-                                        ),
-                                    ],
-                                    align='top',
-                                    width=3
-                                ),
-                                dbc.Col(
-                                    className='col-9',
-                                    #style={'background-color': 'darkgray'},  # Change 'lightgray' to 'darkgray' for dark backgroun
-                                    children=[
-                                        html.H4("Growth Rate %", style={'text-align': 'left', 'color': 'black'}),
-                                        dcc.Dropdown(
-                                            id='country-dropdown-growth',
-                                            options=[{'label': country, 'value': country} for country in countries],
-                                            value=['Germany', 'United States', 'China'],  # Default selected countries
-                                            multi=True
-                                        ),
-                                        dcc.Graph(id='growth-rate'),
-                                    ],
-                                    align='center',
-                                    width=9
-                                )
-                            ],
-                            style={'padding': '20px'}
-                        ),
-                        html.P("Developed By: Suleman Butt", 
-                        style={'text-align': 'left', 'font-weight': 'bold', 'color': 'black'}),
-                        html.P("Data Source: Our World in Data ",
-                        style={'text-align': 'left', 'font-family': 'Calibri', 'font-style': 'italic', 'display': 'inline'}),
-                        html.A("https://ourworldindata.org/grapher/gdp-per-capita-worldbank",
-                        href="https://ourworldindata.org/grapher/gdp-per-capita-worldbank",
-                        target="_blank",
-                        style={'text-align': 'left', 'font-family': 'Calibri', 'color': 'black', 'display': 'inline'})
-                    ],
-                    align='center',
-                    width=12
-                ),
-            ]
-        )
-    ]
-)
+# Define the app layout; it lists the countries and years of a dataset version
+def build_layout(store):
+    # Dropdown options, built once and shared by the three country dropdowns
+    country_options = [{'label': country, 'value': country} for country in store.countries.tolist()]
+    year_options = [{'label': year, 'value': year} for year in store.years]
+    engine = analytics_engine(store)
+    years = slider_years(store)
+    return dbc.Container(
+        style={'font-family': 'Arial, sans-serif', 'padding': '30px'},
+        fluid=True,
+        children=[
+            dbc.Row(
+                className='align-items-start',
+                children=[
+                    dbc.Col(
+                        className='col-8',
+                        children=[
+                            html.H2("World GDP per Capita Dashboard", style={'text-align': 'center', 'color': 'black'}),
+                            html.H4("Visualizing Global Economic Growth from 1990 to 2020", style={'text-align': 'center', 'color': 'black'}),
+                            html.P(
+                                """Visualize the growth of world GDP per capita from 1990 to 2020 through this interactive dashboard. 
+                                Explore the percentage growth in GDP per capita for each country, as represented on a choropleth map. 
+                                Gain insights into global economic trends and the impact on living standards worldwide. 
+                                Analyze the development of GDP per capita over time using line charts, compare countries using bar charts, 
+                                and explore the growth rate and top-ranking countries for a comprehensive understanding of 
+                                global economic dynamics.""",
+                                style={'text-align': 'justify', 'padding': '20px', 'font-family': 'Calibri'}
+                            ),
+                            dbc.Container(
+                                className='slider-container',
+                                children=[
+                                    dcc.Slider(
+                                        id='year-slider',
+                                        min=0,
+                                        max=len(years) - 1,
+                                        value=0,
+                                        marks=slider_marks(years),
+                                        step=1,
+                                        className='slider'
+                                    ),
+                                    *([
+                                        html.Button('Play', id='play-button', n_clicks=0, className='btn btn-outline-primary btn-sm'),
+                                        dcc.Interval(id='year-player', interval=800, disabled=True),
+                                        dcc.Store(id='year-matrix'),
+                                    ] if CLIENTSIDE_SLIDER else [])
+                                ],
+                                fluid=True,
+                                style={'padding': '20px'}
+                            ),
+                            dbc.Row(
+                                children=[
+                                    dbc.Col(
+                                        className='col-8',
+                                        children=[
+                                            html.H3(
+                                                id='title',
+                                                style={'text-align': 'center', 'margin-top': '10px', 'color': 'black'}
+                                            ),
+                                            dcc.Graph(id='choropleth-graph'),
+                                        ],
+                                        align='top',
+                                        width=8
+                                    ),
+                                    dbc.Col(
+                                        className='col-4',
+                                        children=[
+                                            html.H5("Top Countries with Highest GDP per Capita", style={'text-align': 'left', 'color': 'black'}),
+                                            html.Div(id='gdp-table'),
+                                            dbc.Row(
+                                                children=[
+                                                    dbc.Col(
+                                                        dcc.Dropdown(
+                                                            id='table-page-size',
+                                                            options=[{'label': f'Top {n}', 'value': n} for n in table_page_sizes],
+                                                            value=table_page_sizes[0],
+                                                            clearable=False
+                                                        ),
+                                                        width=6
+                                                    ),
+                                                    dbc.Col(
+                                                        dcc.Input(id='table-page', type='number', min=1, step=1, value=1, placeholder='Page'),
+                                                        width=6
+                                                    ),
+                                                ]
+                                            ),
+                                        ],
+                                        align='top',
+                                        width=4
+                                    ),
+                                ],
+                                style={'padding': '20px'}
+                            ),
+                            dbc.Row(
+                                children=[
+                                    dbc.Col(
+                                        className='col-3',
+                                        children=[
+                                            html.H4("Progression Analysis", style={'text-align': 'left', 'color': 'black'}),
+                                            html.H6("Comparative Evolution of Selected Countries Over Time: 1990-2020", style={'text-align': 'left', 'color': 'black'}),
+                                            html.P(
+                                                """This line chart showcases the development of GDP per capita from 1990 to 2020. 
+                                                Explore the changes in economic prosperity over time as countries progress and evolve. 
+                                                By selecting specific countries, you can compare their individual growth trajectories 
+                                                and gain insights into the factors influencing their GDP per capita. 
+                                                Observe trends, fluctuations, and significant milestones as you analyze the dynamic 
+                                                nature of economic development across nations. Discover the story behind GDP per capita 
+                                                and its impact on countries' standards of living and overall economic well-being.""",
+                                                style={'text-align': 'justify', 'padding': '5px', 'font-family': 'Calibri'}
+                                            ),
+                                        ],
+                                        align='top',
+                                        width=3
+                                    ),
+                                    dbc.Col(
+                                        className='col-9',
+                                        children=[
+                                            html.H4("Line Chart", style={'text-align': 'left', 'color': 'black'}),
+                                            dcc.Dropdown(
+                                                id='country-dropdown-line',
+                                                options=country_options,
+                                                value=['Germany', 'United States', 'China'],  # Default selected countries
+                                                multi=True
+                                            ),
+                                            dcc.Graph(id='line-chart'),
+                                        ],
+                                        align='center',
+                                        width=9
+                                    ),
+                                ],
+                                style={'padding': '20px'}
+                            ),
+                            dbc.Row(
+                                children=[
+                                    dbc.Col(
+                                        className='col-9',
+                                        children=[
+                                            html.H4("Bar Chart", style={'text-align': 'left', 'color': 'black'}),
+                                            dcc.Dropdown(
+                                                id='country-dropdown-bar',
+                                                options=country_options,
+                                                value=['Germany', 'United States', 'China'],  # Default selected countries
+                                                multi=True
+                                            ),
+                                            dcc.Dropdown(
+                                                id='year-dropdown-bar',
+                                                options=year_options,
+                                                value=store.years[-1],  # Set default value to the last year
+                                                multi=False
+                                            ),
+                                            dcc.Graph(id='bar-chart'),
+                                        ],
+                                        align='center',
+                                        width=9
+                                    ),
+                                    dbc.Col(
+                                        className='col-3',
+                                        children=[
+                                            html.H4("Comparison Analysis", style={'text-align': 'left', 'color': 'black'}),
+                                            html.H6("Comparative Analysis of Selected Countries for a Specific Year", style={'text-align': 'left', 'color': 'black'}),
+                                            html.P(
+                                                """In this part of the dashboard, you can select multiple countries of your choice and choose 
+                                                a particular year to perform a GDP per capita analysis. The results will 
+                                                be displayed in ascending order, with the country having a higher GDP per capita appearing at the top of the list. 
+                                                This allows you to compare the economic performance of different countries 
+                                                and gain insights into their relative prosperity.""",
+                                                style={'text-align': 'justify', 'padding': '5px', 'font-family': 'Calibri'}
+                                            ),
+                                        ],
+                                        align='top',
+                                        width=3
+                                    ),
+                                ],
+                                style={'padding': '20px'}
+                            ),
+                            dbc.Row(
+                                children=[
+                                    dbc.Col(
+                                        className='col-3',
+                                        children=[
+                                            html.H4("Growth Rate Analysis", style={'text-align': 'left', 'color': 'black'}),
+                                            html.H6("Analyzing the Annual Percentage Growth of GDP per Capita (%)", style={'text-align': 'left', 'color': 'black'}),
+                                            html.P(
+                                                """Explore the GDP growth rate percentage analysis to understand the dynamic changes in 
+                                                economic performance across countries. This visualization showcases the annual growth 
+                                                rates of GDP from 1990 to 2020, providing insights into the speed and direction of 
+                                                economic expansion. Compare the growth rates of different countries and uncover trends, 
+                                                fluctuations, and significant milestones. Gain a deeper understanding of the factors 
+                                                driving economic growth and the implications for countries' development and prosperity.""",
+                                                style={'text-align': 'justify', 'padding': '5px', 'font-family': 'Calibri'}
+                                            ),
+                                        ],
+                                        align='top',
+                                        width=3
+                                    ),
+                                    dbc.Col(
+                                        className='col-9',
+                                        #style={'background-color': 'darkgray'},  # Change 'lightgray' to 'darkgray' for dark backgroun
+                                        children=[
+                                            html.H4("Growth Rate %", style={'text-align': 'left', 'color': 'black'}),
+                                            dcc.Dropdown(
+                                                id='country-dropdown-growth',
+                                                options=country_options,
+                                                value=['Germany', 'United States', 'China'],  # Default selected countries
+                                                multi=True
+                                            ),
+                                            dcc.Graph(id='growth-rate'),
+                                        ],
+                                        align='center',
+                                        width=9
+                                    )
+                                ],
+                                style={'padding': '20px'}
+                            ),
+                            dbc.Row(
+                                children=[
+                                    dbc.Col(
+                                        className='col-3',
+                                        children=[
+                                            html.H4("Group Comparison", style={'text-align': 'left', 'color': 'black'}),
+                                            html.H6("Regional and Income-Group Aggregates over a Range of Years", style={'text-align': 'left', 'color': 'black'}),
+                                            html.P(
+                                                """Compare groups of countries over any range of years: their average GDP per capita, 
+                                                or how much it grew between the first and the last year of the range. Income quartiles 
+                                                group the countries by GDP per capita in the latest year. Below, the countries of the 
+                                                first selected group are ranked by their compound annual growth over the same years.""",
+                                                style={'text-align': 'justify', 'padding': '5px', 'font-family': 'Calibri'}
+                                            ),
+                                            dcc.RadioItems(
+                                                id='group-measure',
+                                                options=group_measures,
+                                                value='level',
+                                                labelStyle={'display': 'block'}
+                                            ),
+                                            dcc.RadioItems(
+                                                id='group-weighting',
+                                                options=[
+                                                    {'label': 'Simple average', 'value': 'mean'},
+                                                    {'label': 'Population-weighted', 'value': 'weighted', 'disabled': not engine.weighted},
+                                                ],
+                                                value='mean',
+                                                labelStyle={'display': 'block'},
+                                                style={'margin-top': '10px'}
+                                            ),
+                                        ],
+                                        align='top',
+                                        width=3
+                                    ),
+                                    dbc.Col(
+                                        className='col-9',
+                                        children=[
+                                            dcc.Dropdown(
+                                                id='group-dropdown',
+                                                options=[{'label': group, 'value': group} for group in engine.group_names],
+                                                value=[ALL_COUNTRIES, *INCOME_QUARTILES],
+                                                multi=True
+                                            ),
+                                            dcc.RangeSlider(
+                                                id='year-range',
+                                                min=0,
+                                                max=len(store.years) - 1,
+                                                step=1,
+                                                value=[0, len(store.years) - 1],
+                                                marks={i: year for i, year in enumerate(store.years) if int(year) % 5 == 0 or i == len(store.years) - 1},
+                                            ),
+                                            dcc.Graph(id='group-chart'),
+                                            dcc.Graph(id='growth-ranking-chart'),
+                                        ],
+                                        align='center',
+                                        width=9
+                                    )
+                                ],
+                                style={'padding': '20px'}
+                            ),
+                            html.P("Developed By: Suleman Butt", 
+                            style={'text-align': 'left', 'font-weight': 'bold', 'color': 'black'}),
+                            html.P("Data Source: Our World in Data ",
+                            style={'text-align': 'left', 'font-family': 'Calibri', 'font-style': 'italic', 'display': 'inline'}),
+                            html.A("https://ourworldindata.org/grapher/gdp-per-capita-worldbank",
+                            href="https://ourworldindata.org/grapher/gdp-per-capita-worldbank",
+                            target="_blank",
+                            style={'text-align': 'left', 'font-family': 'Calibri', 'color': 'black', 'display': 'inline'})
+                        ],
+                        align='center',
+                        width=12
+                    ),
+                ]
+            )
+        ]
+    )
+
+
+# The layout is served per page load, so the dropdowns follow dataset reloads
+_layouts = {}
+
+
+def serve_layout():
+    store = live_store.current
+    if store.version not in _layouts:
+        _layouts.clear()
+        _layouts[store.version] = build_layout(store)
+    return _layouts[store.version]
+
+
+app.layout = serve_layout
+
+#----------***** Figure Helpers ***** -----------
+
+# Selections with more countries than this are drawn with WebGL (Scattergl)
+WEBGL_THRESHOLD = 50
+
+# Selections with more countries than this are summarized as median and percentile bands (0 disables it)
+AGGREGATE_THRESHOLD = int(os.environ.get('AGGREGATE_THRESHOLD', 300))
+
+
+def series_figure(matrix, names, x, hovertemplate, decimals=0):
+    # One lines+markers trace per row of the matrix, built in a single pass.
+    # The traces are plain dicts added without per-trace validation, and the palette is cycled.
+    if AGGREGATE_THRESHOLD and len(names) > AGGREGATE_THRESHOLD:
+        return band_figure(matrix, x, decimals)
+
+    colors = qualitative.Set3  # Use the qualitative Set3 color palette
+    trace_type = 'scattergl' if len(names) > WEBGL_THRESHOLD else 'scatter'
+    return go.Figure(
+        [
+            dict(
+                type=trace_type,
+                mode='lines+markers',
+                **x,
+                y=compact.array(row, decimals),
+                name=name,
+                line=dict(color=colors[i % len(colors)]),
+                marker=dict(color=colors[i % len(colors)]),
+                hovertemplate=hovertemplate,
+            )
+            for i, (name, row) in enumerate(zip(names, matrix))
+        ],
+        _validate=False,
+    )
+
+
+def band_figure(matrix, x, decimals=0):
+    # Density view of many series: the median and the 25-75 and 10-90 percentile bands per year
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # years where every series is missing
+        p10, p25, p50, p75, p90 = np.nanpercentile(matrix, [10, 25, 50, 75, 90], axis=0)
+
+    color = 'rgb(31,158,137)'
+    fig = go.Figure()
+    for upper, lower, name, opacity in [(p90, p10, '10th-90th percentile', 0.2), (p75, p25, '25th-75th percentile', 0.35)]:
+        fig.add_trace(go.Scatter(**x, y=compact.array(upper, decimals), mode='lines', line=dict(width=0),
+                                 showlegend=False, hoverinfo='skip', legendgroup=name))
+        fig.add_trace(go.Scatter(**x, y=compact.array(lower, decimals), mode='lines', line=dict(width=0),
+                                 fill='tonexty', fillcolor=color.replace('rgb', 'rgba').replace(')', f',{opacity})'),
+                                 name=name, legendgroup=name, hoverinfo='skip'))
+    fig.add_trace(go.Scatter(**x, y=compact.array(p50, decimals), mode='lines', line=dict(color=color, width=2),
+                             name=f'Median of {len(matrix)} countries'))
+    return fig
+
 
 #----------***** Callback Funtions ***** -----------
 
+# The title, choropleth and table callbacks of the year slider are registered below,
+# either on the server or replaced by clientside callbacks
+
 # Define the callback function to update the title based on the selected year
-@app.callback(
-    dash.dependencies.Output('title', 'children'),
-    [dash.dependencies.Input('year-slider', 'value')]
-)
-def update_title(year_index):
-    year = included_years[year_index]
+@metrics.instrument('update_title')
+@figure_cache.cached('update_title')
+def update_title(store, year_index):
+    year = slider_years(store)[year_index]
     title = html.H5(
         f'GDP per Capita {year}',
         style={'text-align': 'center', 'margin-bottom': '0px', 'color': 'black'}
     )
     return title
 
-# Define the callback function to update the choropleth graph based on the selected year
-@app.callback(
-    dash.dependencies.Output('choropleth-graph', 'figure'),
-    [dash.dependencies.Input('year-slider', 'value')]
-)
-def update_choropleth(year_index):
-    year = included_years[year_index]
-
-    fig = px.choropleth(
-        data_frame=data,
-        locations='Country Code',
-        locationmode='ISO-3',
-        color=str(year),
-        hover_data={'Country ': True, str(year): ':$,.0f'},
-        color_continuous_scale='viridis',
-        range_color=(data[str(year)].min(), data[str(year)].max()),
-        labels={str(year): 'GDP per Capita '},
-    )
+# Choropleth of one year of a dataset version (also used by export.py for every year)
+def choropleth_figure(store, year):
+    with metrics.phase('select'):
+        values = np.nan_to_num(store.column(year))
+
+    with metrics.phase('build'):
+        fig = go.Figure(go.Choropleth(
+            locations=store.codes,
+            locationmode='ISO-3',
+            z=compact.array(values),
+            coloraxis='coloraxis',
+            customdata=store.countries,
+            hovertemplate='Country =%{customdata}<br>Country Code=%{location}<br>GDP per Capita =%{z:$,.0f}<extra></extra>',
+        ))
 
-    fig.update_geos(showframe=False, showcoastlines=False, projection_type="equirectangular")
-    fig.update_layout(
-        margin=dict(l=0, r=80, t=80, b=0),
-        coloraxis_colorbar=dict(title='GDP per Capita $'),
-    )
+        fig.update_geos(showframe=False, showcoastlines=False, projection_type="equirectangular")
+        fig.update_layout(
+            margin=dict(l=0, r=80, t=80, b=0),
+            coloraxis=dict(
+                colorscale='viridis',
+                cmin=values.min(),
+                cmax=values.max(),
+                colorbar=dict(title='GDP per Capita $'),
+            ),
+        )
 
-    return fig
+    return compact.figure(fig)
+
+# Define the callback function to update the choropleth graph based on the selected year
+@metrics.instrument('update_choropleth')
+@figure_cache.cached('update_choropleth')
+def update_choropleth(store, year_index):
+    return choropleth_figure(store, slider_years(store)[year_index])
 
 # Callback for updating the GDP per capita table
-@app.callback(
-    Output('gdp-table', 'children'),
-    [Input('year-slider', 'value')]
-)
-def update_gdp_table(selected_year):
-    global data
-    year = included_years[selected_year]
-    data_year = data[['Country ', str(year)]]
-    data_year['GDP per capita'] = data_year[str(year)]
-    data_year = data_year[['Country ', 'GDP per capita']]
-    data_year = data_year.sort_values('GDP per capita', ascending=False)
-    
-    # Add rank column to the DataFrame
-    data_year['Rank'] = range(1, len(data_year) + 1)
-    
+@metrics.instrument('update_gdp_table')
+@figure_cache.cached('update_gdp_table')
+def update_gdp_table(store, selected_year, page_size, page):
+    with metrics.phase('select'):
+        year = slider_years(store)[selected_year]
+
+        # The ranking is precomputed per year, so a page is a slice of it
+        pages = max(1, -(-len(store.countries) // page_size))
+        page = min(max(int(page or 1), 1), pages)
+        rows = store.top(year, page_size, page)
+        values = store.values[rows, store.col(year)]
+        ranks = store.ranks[rows, store.col(year)]
+
     # Create the table using dbc.Table
-    table = dbc.Table(
-        [
-            html.Thead(html.Tr([html.Th('Rank'), html.Th('Country'), html.Th('GDP per Capita')])),
-            html.Tbody([
-                html.Tr([
-                    html.Td(data_year['Rank'].iloc[i]),
-                    html.Td(data_year['Country '].iloc[i]),
-                    html.Td('$ {:,.0f}'.format(data_year['GDP per capita'].iloc[i]))
-                ]) for i in range(min(len(data_year), 10))
-            ])
-        ],
-        striped=True,
-        bordered=True,
-        hover=True,
-        responsive=True,
-        className='table'
-    )
-    
+    with metrics.phase('build'):
+        table = dbc.Table(
+            [
+                html.Thead(html.Tr([html.Th('Rank'), html.Th('Country'), html.Th('GDP per Capita')])),
+                html.Tbody([
+                    html.Tr([
+                        html.Td(rank),
+                        html.Td(store.countries[row]),
+                        html.Td('$ {:,.0f}'.format(value) if not np.isnan(value) else 'n/a')
+                    ]) for row, rank, value in zip(rows, ranks, values)
+                ])
+            ],
+            striped=True,
+            bordered=True,
+            hover=True,
+            responsive=True,
+            className='table'
+        )
+
     return table
 
+if CLIENTSIDE_SLIDER:
+    # Ship the year matrix and the choropleth of the first year once per page load;
+    # assets/clientside_slider.js then handles every slider step in the browser
+    @app.callback(
+        Output('year-matrix', 'data'),
+        [Input('year-matrix', 'id')]
+    )
+    @metrics.instrument('load_year_matrix')
+    @figure_cache.cached('load_year_matrix')
+    def load_year_matrix(store, _):
+        with metrics.phase('select'):
+            values = np.round(store.values.T)
+            matrix = np.where(np.isnan(values), None, np.nan_to_num(values).astype(np.int64).astype(object))
+        return {
+            'years': store.years,
+            'countries': store.countries.tolist(),
+            'values': matrix.tolist(),
+            'order': store.order.T.tolist(),
+            'figure': choropleth_figure(store, store.years[0]),
+        }
+
+    slider_inputs = [Input('year-slider', 'value'), Input('year-matrix', 'data')]
+    app.clientside_callback(ClientsideFunction('gdp_slider', 'title'), Output('title', 'children'), slider_inputs)
+    app.clientside_callback(ClientsideFunction('gdp_slider', 'choropleth'), Output('choropleth-graph', 'figure'), slider_inputs)
+    app.clientside_callback(
+        ClientsideFunction('gdp_slider', 'table'),
+        Output('gdp-table', 'children'),
+        [Input('year-slider', 'value'), Input('table-page-size', 'value'), Input('table-page', 'value'), Input('year-matrix', 'data')]
+    )
+
+    # Play/pause animation over the years
+    app.clientside_callback(
+        ClientsideFunction('gdp_slider', 'toggle'),
+        [Output('year-player', 'disabled'), Output('play-button', 'children')],
+        [Input('play-button', 'n_clicks')],
+        [State('year-player', 'disabled')]
+    )
+    app.clientside_callback(
+        ClientsideFunction('gdp_slider', 'step'),
+        Output('year-slider', 'value'),
+        [Input('year-player', 'n_intervals')],
+        [State('year-slider', 'value'), State('year-slider', 'max')]
+    )
+else:
+    app.callback(Output('title', 'children'), [Input('year-slider', 'value')])(update_title)
+    app.callback(Output('choropleth-graph', 'figure'), [Input('year-slider', 'value')])(update_choropleth)
+    app.callback(
+        Output('gdp-table', 'children'),
+        [Input('year-slider', 'value'), Input('table-page-size', 'value'), Input('table-page', 'value')]
+    )(update_gdp_table)
+
+# Line chart of the selected countries (also used by export.py)
+def line_figure(store, countries):
+    # Traces follow the dataset order, as the plotly express version did
+    with metrics.phase('select'):
+        rows = np.unique(store.rows(countries))
+        values = np.nan_to_num(store.values[rows])
+
+    with metrics.phase('build'):
+        fig = series_figure(
+            values,
+            store.countries[rows],
+            compact.x_values(store.years),
+            hovertemplate='Country =%{fullData.name}<br>Year=%{x}<br>GDP per Capita $=%{y}<extra></extra>',
+        )
+        fig.update_layout(
+            margin=dict(l=0, r=20, t=20, b=0),
+            xaxis=dict(title='Year'),
+            yaxis=dict(title='GDP per Capita $'),
+            legend_title='Country',
+            showlegend=True
+        )
+
+    return compact.figure(fig)
+
 # Define the callback function to update the line chart based on the selected countries
 @app.callback(
     Output('line-chart', 'figure'),
     [Input('country-dropdown-line', 'value')]
 )
-def update_line_chart(countries):
-    colors = px.colors.qualitative.Set3  # Use the qualitative Set3 color palette
-
-    filtered_data = data[data['Country '].isin(countries)]
-    filtered_data = filtered_data.melt(id_vars=['Country '], var_name='Year', value_name='GDP per Capita')
-
-    fig = px.line(
-        filtered_data,
-        x='Year',
-        y='GDP per Capita',
-        color='Country ',
-        labels={'GDP per Capita': 'GDP per Capita $'},
-        color_discrete_sequence=colors
-    )
+@metrics.instrument('update_line_chart')
+@figure_cache.cached('update_line_chart')
+def update_line_chart(store, countries):
+    return line_figure(store, countries)
+
+
+# Bar chart of the selected countries in a year (also used by export.py)
+def bar_figure(store, countries, year):
+    colors = qualitative.Set3  # Use the qualitative Set3 color palette
+
+    with metrics.phase('select'):
+        rows = store.rows(countries)
+        values = np.nan_to_num(store.values[rows, store.col(year)])
+        order = np.argsort(-values, kind='stable')
+        rows, values = rows[order], values[order]
+
+    with metrics.phase('build'):
+        fig = go.Figure([
+            go.Bar(
+                x=compact.array([value]),
+                y=[store.countries[row]],
+                orientation='h',
+                name=store.countries[row],
+                marker=dict(color=colors[i % len(colors)]),
+                text=[f'${int(value):,d}'],  # Format the value with $ sign and no decimals
+                hovertext=[store.countries[row]],
+                hovertemplate='<b>%{hovertext}</b><br><br>GDP per Capita: $%{x:,d}',
+            )
+            for i, (row, value) in enumerate(zip(rows, values))
+        ])
+        fig.update_layout(
+            title={
+                'text': f'Selected {len(countries)} Countries in year {year}',
+                'x': 0.5,  # Set x to 0.5 for center alignment
+                'y': 0.95,  # Adjust y value for vertical alignment if needed
+                'xanchor': 'center',
+                'yanchor': 'top'
+            },
+            xaxis=dict(title='GDP per Capita'),
+            yaxis=dict(title='Country', categoryorder='array', categoryarray=store.countries[rows[::-1]]),  # Highest value on top
+            margin=dict(l=50, r=50, t=70, b=50),
+            barmode='relative',
+            legend_title='Country ',
+            showlegend=True
 
-    fig.update_traces(mode='lines+markers')
-    fig.update_layout(
-        margin=dict(l=0, r=20, t=20, b=0),
-        yaxis=dict(title='GDP per Capita $'),
-        legend_title='Country',
-        showlegend=True
-    )
-
-    return fig
+        )
 
+    return compact.figure(fig)
 
 # Define the callback function to update the bar chart based on the selected countries and year
 @app.callback(
@@ -347,79 +752,167 @@ def update_line_chart(countries):
     [dash.dependencies.Input('country-dropdown-bar', 'value'),
      dash.dependencies.Input('year-dropdown-bar', 'value')]
 )
-def update_bar_chart(countries, year):
-    colors = px.colors.qualitative.Set3  # Use the qualitative Set3 color palette
-
-    filtered_data = data[data['Country '].isin(countries)]
-    filtered_data = filtered_data.sort_values(year, ascending=False)
-
-    fig = px.bar(
-        filtered_data,
-        x=year,
-        y='Country ',
-        orientation='h',
-        color='Country ',
-        color_discrete_sequence=colors[:len(countries)],
-        text=filtered_data[year].apply(lambda x: f'${int(x):,d}'),  # Format the value with $ sign and no decimals,
-        labels={year: 'GDP per Capita '},
-        hover_name='Country ',
-        hover_data={'Country ': True, year: False},  # Show only country name in hover data
-    )
-    fig.update_traces(hovertemplate='<b>%{hovertext}</b><br><br>GDP per Capita: $%{x:,d}')  # Update hover template
-    fig.update_layout(
-        title={
-            'text': f'Selected {len(countries)} Countries in year {year}',
-            'x': 0.5,  # Set x to 0.5 for center alignment
-            'y': 0.95,  # Adjust y value for vertical alignment if needed
-            'xanchor': 'center',
-            'yanchor': 'top'
-        },
-        xaxis=dict(title='GDP per Capita'),
-        yaxis=dict(title='Country'),
-        margin=dict(l=50, r=50, t=70, b=50),
-        showlegend=True
-        
-    )
+@metrics.instrument('update_bar_chart')
+@figure_cache.cached('update_bar_chart')
+def update_bar_chart(store, countries, year):
+    return bar_figure(store, countries, year)
+
+# Growth rate chart of the selected countries (also used by export.py)
+def growth_figure(store, countries):
+    # Growth rates are precomputed for every country; missing years stay as gaps
+    with metrics.phase('select'):
+        rows = store.rows(countries)
+        growth = store.growth[rows]
+
+    with metrics.phase('build'):
+        fig = series_figure(
+            growth,
+            store.countries[rows],
+            compact.x_values(store.years[1:]),
+            hovertemplate='Year: %{x}<br>Country: %{fullData.name}<br>Growth Rate: %{y:.2f}%',
+            decimals=2,
+        )
+        fig.update_layout(
 
-    return fig
+            xaxis=dict(title='Year'),
+            yaxis=dict(title='Growth Rate (%)'),
+            margin=dict(l=50, r=50, t=70, b=50),
+            showlegend=True
+        )
+
+    return compact.figure(fig)
 
 # Define the callback function to update the growth rate graph based on the selected countries
 @app.callback(
     dash.dependencies.Output('growth-rate', 'figure'),
     [dash.dependencies.Input('country-dropdown-growth', 'value')]
 )
-def update_growth_rate(countries):
-    colors = px.colors.qualitative.Set3  # Use the qualitative Set3 color palette
+@metrics.instrument('update_growth_rate')
+@figure_cache.cached('update_growth_rate')
+def update_growth_rate(store, countries):
+    return growth_figure(store, countries)
 
-    filtered_data = data[data['Country '].isin(countries)].copy()
-    filtered_data = filtered_data.melt(id_vars=['Country ', 'Country Code'], var_name='Year', value_name='GDP per Capita')
-    filtered_data['Growth Rate'] = filtered_data.groupby('Country Code')['GDP per Capita'].pct_change() * 100
 
-    fig = go.Figure()
+# Define the callback function to compare the selected groups over the selected range of years
+@app.callback(
+    Output('group-chart', 'figure'),
+    [Input('group-dropdown', 'value'),
+     Input('year-range', 'value'),
+     Input('group-measure', 'value'),
+     Input('group-weighting', 'value')]
+)
+@metrics.instrument('update_group_chart')
+@figure_cache.cached('update_group_chart')
+def update_group_chart(store, groups, year_range, measure, weighting):
+    colors = qualitative.Set3  # Use the qualitative Set3 color palette
+
+    # Prefix sums make any group and year range a few array operations, memoized by the engine
+    with metrics.phase('select'):
+        engine = analytics_engine(store)
+        groups = [group for group in groups or [] if group in engine.group_index]
+        start, end = store.years[year_range[0]], store.years[year_range[1]]
+        if not engine.weighted:
+            weighting = 'mean'
+        values = engine.compare(tuple(groups), start, end, measure, weighting)
+
+    with metrics.phase('build'):
+        if measure == 'level':
+            text = ['n/a' if np.isnan(v) else f'${v:,.0f}' for v in values]
+            title, decimals = f'GDP per Capita {start}-{end}', 0
+        else:
+            text = ['n/a' if np.isnan(v) else f'{v:.1f}%' for v in values]
+            title = f'{"Annual growth" if measure == "cagr" else "Growth"} of GDP per Capita {start}-{end}'
+            decimals = 2
+        fig = go.Figure(go.Bar(
+            x=compact.array(np.nan_to_num(values), decimals),
+            y=groups,
+            orientation='h',
+            marker=dict(color=[colors[i % len(colors)] for i in range(len(groups))]),
+            text=text,
+            hovertemplate='<b>%{y}</b><br>%{text}<extra></extra>',
+        ))
+        fig.update_layout(
+            title={'text': title, 'x': 0.5, 'xanchor': 'center'},
+            xaxis=dict(title='GDP per Capita $' if measure == 'level' else 'Growth (%)'),
+            yaxis=dict(autorange='reversed'),
+            margin=dict(l=50, r=50, t=70, b=50),
+        )
+
+    return compact.figure(fig)
 
-    for country in countries:
-        country_data = filtered_data[filtered_data['Country '] == country]
-        fig.add_trace(go.Scatter(
-            x=country_data['Year'],
-            y=country_data['Growth Rate'],
-            mode='lines+markers',
-            line=dict(color=colors[countries.index(country)]),
-            marker=dict(color=colors[countries.index(country)]),
-            hovertemplate='Year: %{x}<br>Country: %{text}<br>Growth Rate: %{y:.2f}%',
-            text=[country] * len(country_data),
-            name=country
+# Define the callback function to rank the countries of the first selected group by growth between the selected years
+@app.callback(
+    Output('growth-ranking-chart', 'figure'),
+    [Input('group-dropdown', 'value'),
+     Input('year-range', 'value')]
+)
+@metrics.instrument('update_growth_ranking')
+@figure_cache.cached('update_growth_ranking')
+def update_growth_ranking(store, groups, year_range):
+    with metrics.phase('select'):
+        engine = analytics_engine(store)
+        group = next((group for group in groups or [] if group in engine.group_index), ALL_COUNTRIES)
+        start, end = store.years[year_range[0]], store.years[year_range[1]]
+        rows, cagr = engine.growth_ranking(group, start, end)
+
+    with metrics.phase('build'):
+        fig = go.Figure(go.Bar(
+            x=compact.array(cagr, 2),
+            y=store.countries[rows],
+            orientation='h',
+            marker=dict(color='rgb(31,158,137)'),
+            hovertemplate='<b>%{y}</b><br>Annual growth: %{x:.2f}%<extra></extra>',
         ))
+        fig.update_layout(
+            title={'text': f'Fastest-growing countries in {group}, {start}-{end}', 'x': 0.5, 'xanchor': 'center'},
+            xaxis=dict(title='Compound annual growth (%)'),
+            yaxis=dict(autorange='reversed'),
+            margin=dict(l=50, r=50, t=70, b=50),
+        )
 
-    fig.update_layout(
-        
-        xaxis=dict(title='Year'),
-        yaxis=dict(title='Growth Rate (%)'),
-        margin=dict(l=50, r=50, t=70, b=50),
-        showlegend=True
-    )
+    return compact.figure(fig)
 
-    return fig
+
+# Precompute the year-slider outputs so the first visitors hit a warm cache
+def warm_figure_cache():
+    if CLIENTSIDE_SLIDER:
+        figure_cache.warm('load_year_matrix', [('year-matrix',)])
+        return
+    year_indices = range(len(slider_years(live_store.current)))
+    figure_cache.warm('update_choropleth', [(i,) for i in year_indices])
+    figure_cache.warm('update_gdp_table', [(i, table_page_sizes[0], 1) for i in year_indices])
+
+
+# Which cached outputs still hold after a dataset reload, given the changed years and countries
+# and the slider years of the new version
+def unaffected_by(changes, years):
+    # Slider positions map to other years once the clientside slider's years change
+    positions_moved = CLIENTSIDE_SLIDER and changes.columns_changed
+
+    def keep(name, args):
+        if name == 'update_title':
+            return not positions_moved
+        if name in ('update_choropleth', 'update_gdp_table'):
+            return not (positions_moved or changes.rows_changed) and str(years[args[0]]) not in changes.years
+        if name in ('update_line_chart', 'update_growth_rate'):
+            return not changes.columns_changed and changes.countries.isdisjoint(args[0] or ())
+        if name == 'update_bar_chart':
+            countries, year = args
+            return changes.countries.isdisjoint(countries or ()) or (not changes.rows_changed and year not in changes.years)
+        return False
+
+    return keep
+
+
+# On a reload, keep the cached outputs the changed cells don't touch and warm the slider again
+@live_store.on_swap
+def invalidate_figure_cache(old, new, changes):
+    figure_cache.rebase(new.version, unaffected_by(changes, slider_years(new)))
+    warm_figure_cache()
 
 
 if __name__ == '__main__':
-    app.run_server(debug=True)
\ No newline at end of file
+    warm_figure_cache()
+    if DATA_WATCH_INTERVAL > 0:
+        live_store.watch(DATA_WATCH_INTERVAL)
+    app.run_server(debug=True)
@@ -0,0 +1,88 @@
+// Clientside year slider (CLIENTSIDE_SLIDER=1): the title, the choropleth colors and the ranking
+// table are derived in the browser from the year matrix that app.py ships once into the
+// 'year-matrix' store, so moving the slider makes no server round trips.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    gdp_slider: {
+        title: function (index, matrix) {
+            if (!matrix) {
+                return window.dash_clientside.no_update;
+            }
+            return {
+                namespace: 'dash_html_components',
+                type: 'H5',
+                props: {
+                    children: 'GDP per Capita ' + matrix.years[index],
+                    style: {'text-align': 'center', 'margin-bottom': '0px', 'color': 'black'}
+                }
+            };
+        },
+
+        // Swap the color array of the first year's figure and rescale the color axis
+        choropleth: function (index, matrix) {
+            if (!matrix) {
+                return window.dash_clientside.no_update;
+            }
+            var z = matrix.values[index].map(function (v) { return v === null ? 0 : v; });
+            var cmin = z.reduce(function (a, b) { return Math.min(a, b); }, Infinity);
+            var cmax = z.reduce(function (a, b) { return Math.max(a, b); }, -Infinity);
+            var figure = matrix.figure;
+            var trace = Object.assign({}, figure.data[0], {z: z});
+            var coloraxis = Object.assign({}, figure.layout.coloraxis, {cmin: cmin, cmax: cmax});
+            return Object.assign({}, figure, {
+                data: [trace],
+                layout: Object.assign({}, figure.layout, {coloraxis: coloraxis})
+            });
+        },
+
+        // One page of the precomputed ranking of the selected year
+        table: function (index, pageSize, page, matrix) {
+            if (!matrix) {
+                return window.dash_clientside.no_update;
+            }
+            var order = matrix.order[index];
+            var values = matrix.values[index];
+            var pages = Math.max(1, Math.ceil(order.length / pageSize));
+            page = Math.min(Math.max(Math.floor(page || 1), 1), pages);
+            var start = (page - 1) * pageSize;
+
+            function element(type, children) {
+                return {namespace: 'dash_html_components', type: type, props: {children: children}};
+            }
+
+            var rows = order.slice(start, start + pageSize).map(function (row, i) {
+                var value = values[row];
+                return element('Tr', [
+                    element('Td', start + i + 1),
+                    element('Td', matrix.countries[row]),
+                    element('Td', value === null ? 'n/a' : '$ ' + value.toLocaleString('en-US', {maximumFractionDigits: 0}))
+                ]);
+            });
+            return {
+                namespace: 'dash_bootstrap_components',
+                type: 'Table',
+                props: {
+                    children: [
+                        element('Thead', element('Tr', [element('Th', 'Rank'), element('Th', 'Country'), element('Th', 'GDP per Capita')])),
+                        element('Tbody', rows)
+                    ],
+                    striped: true,
+                    bordered: true,
+                    hover: true,
+                    responsive: true,
+                    className: 'table'
+                }
+            };
+        },
+
+        toggle: function (nClicks, disabled) {
+            if (!nClicks) {
+                return [true, 'Play'];
+            }
+            return [!disabled, disabled ? 'Pause' : 'Play'];
+        },
+
+        step: function (nIntervals, value, max) {
+            return value >= max ? 0 : value + 1;
+        }
+    }
+});
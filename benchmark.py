@@ -0,0 +1,293 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Selection sizes replayed against the country dropdowns
+SELECTION_SIZES = [3, 20, 190]
+
+# Ranking table page sizes replayed against the table callback
+TABLE_PAGE_SIZES = [10, 50]
+
+# Largest acceptable uncompressed response per callback over the scenarios, for the bundled dataset
+PAYLOAD_BUDGETS = {
+    'update_title': 300,
+    'update_choropleth': 8500,
+    'update_gdp_table': 19000,
+    'update_line_chart': 95000,
+    'update_bar_chart': 60000,
+    'update_growth_rate': 86000,
+    'update_group_chart': 3000,
+    'update_growth_ranking': 3000,
+}
+
+
+#-------------***** Synthetic data *****-----------------
+
+def synthesize(path, entities, periods, first_year=1990, seed=0):
+    # Write a CSV with the gdp_per_capita_1990_2020.csv schema: random-walk series with leading gaps
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    start = rng.lognormal(mean=8.5, sigma=1.2, size=(entities, 1))
+    growth = rng.normal(loc=0.02, scale=0.05, size=(entities, periods))
+    values = start * np.exp(np.cumsum(growth, axis=1))
+    first = rng.integers(0, periods // 3, size=entities) * (rng.random(entities) < 0.1)
+    values[np.arange(periods) < first[:, None]] = np.nan
+
+    # Three-letter codes while they last, like the ISO-3 codes of the real data
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    if entities <= 26 ** 3:
+        codes = [letters[i // 676] + letters[i // 26 % 26] + letters[i % 26] for i in range(entities)]
+    else:
+        codes = [f'E{i}' for i in range(entities)]
+    frame = pd.DataFrame(values, columns=[str(first_year + j) for j in range(periods)])
+    frame.insert(0, 'Country Code', codes)
+    frame.insert(0, 'Country ', [f'Entity {i:05d}' for i in range(entities)])
+    frame.to_csv(path, index=False)
+
+
+#-------------***** Callback payloads *****-----------------
+
+def callback_payload(output, inputs):
+    # Request body of /_dash-update-component for a single-output callback
+    component, prop = output.split('.')
+    return {
+        'output': output,
+        'outputs': {'id': component, 'property': prop},
+        'inputs': [{'id': i, 'property': p, 'value': v} for i, p, v in inputs],
+        'changedPropIds': [f'{inputs[0][0]}.{inputs[0][1]}'],
+        'state': [],
+    }
+
+
+def scenarios(store, slider_steps, seed=0):
+    # (callback id, payload) pairs covering slider moves, dropdown selections and year changes
+    rng = random.Random(seed)
+    countries = list(store.countries)
+    default = [c for c in ['Germany', 'United States', 'China'] if c in store.row_index] or countries[:3]
+    selections = [default] + [rng.sample(countries, min(n, len(countries))) for n in SELECTION_SIZES[1:]]
+
+    cases = []
+    for step in range(slider_steps):
+        cases.append(('update_title', callback_payload('title.children', [('year-slider', 'value', step)])))
+        cases.append(('update_choropleth', callback_payload('choropleth-graph.figure', [('year-slider', 'value', step)])))
+        for size in TABLE_PAGE_SIZES:
+            cases.append(('update_gdp_table', callback_payload('gdp-table.children', [
+                ('year-slider', 'value', step), ('table-page-size', 'value', size), ('table-page', 'value', 1)])))
+    for selection in selections:
+        cases.append(('update_line_chart', callback_payload('line-chart.figure', [('country-dropdown-line', 'value', selection)])))
+        cases.append(('update_growth_rate', callback_payload('growth-rate.figure', [('country-dropdown-growth', 'value', selection)])))
+        for year in rng.sample(store.years, min(3, len(store.years))):
+            cases.append(('update_bar_chart', callback_payload('bar-chart.figure', [
+                ('country-dropdown-bar', 'value', selection), ('year-dropdown-bar', 'value', year)])))
+    groups = ['All countries', 'Income quartile 1 (highest)', 'Income quartile 2', 'Income quartile 3', 'Income quartile 4 (lowest)']
+    for _ in range(3):
+        first, last = sorted(rng.sample(range(len(store.years)), 2))
+        for measure in ('level', 'growth', 'cagr'):
+            cases.append(('update_group_chart', callback_payload('group-chart.figure', [
+                ('group-dropdown', 'value', groups), ('year-range', 'value', [first, last]),
+                ('group-measure', 'value', measure), ('group-weighting', 'value', 'mean')])))
+        cases.append(('update_growth_ranking', callback_payload('growth-ranking-chart.figure', [
+            ('group-dropdown', 'value', groups[rng.randrange(len(groups)):]), ('year-range', 'value', [first, last])])))
+    return cases
+
+
+#-------------***** Load generation *****-----------------
+
+def local_sender():
+    # Post to the app in this process through Flask test clients (one per thread); fully offline
+    import app
+    local = threading.local()
+
+    def send(payload):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.server.test_client()
+        response = client.post('/_dash-update-component', json=payload)
+        if response.status_code != 200:
+            raise RuntimeError(f'{payload["output"]}: HTTP {response.status_code}')
+        return len(response.get_data())
+
+    return send
+
+
+def remote_sender(url):
+    endpoint = url.rstrip('/') + '/_dash-update-component'
+
+    def send(payload):
+        request = urllib.request.Request(
+            endpoint, data=json.dumps(payload).encode(), headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request) as response:
+            return len(response.read())
+
+    return send
+
+
+def run(send, cases, total, concurrency):
+    # Replay the cases round-robin at the given concurrency, recording latency and response size
+    results = defaultdict(list)
+    lock = threading.Lock()
+
+    def one(i):
+        name, payload = cases[i % len(cases)]
+        start = time.perf_counter()
+        size = send(payload)
+        elapsed = time.perf_counter() - start
+        with lock:
+            results[name].append((elapsed, size))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    return results, time.perf_counter() - start
+
+
+def summarize(results, wall):
+    report = {}
+    for name, samples in sorted(results.items()):
+        latencies = np.array([s[0] for s in samples]) * 1000
+        sizes = np.array([s[1] for s in samples])
+        report[name] = {
+            'requests': len(samples),
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p95_ms': float(np.percentile(latencies, 95)),
+            'p99_ms': float(np.percentile(latencies, 99)),
+            'throughput_rps': len(samples) / wall,
+            'mean_bytes': float(sizes.mean()),
+            'max_bytes': int(sizes.max()),
+        }
+    return report
+
+
+def print_report(report):
+    header = f'{"callback":<20} {"requests":>8} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"req/s":>8} {"mean bytes":>11} {"max bytes":>10}'
+    print(header)
+    print('-' * len(header))
+    for name, r in report.items():
+        print(f'{name:<20} {r["requests"]:>8} {r["p50_ms"]:>9.1f} {r["p95_ms"]:>9.1f} {r["p99_ms"]:>9.1f} '
+              f'{r["throughput_rps"]:>8.1f} {r["mean_bytes"]:>11.0f} {r["max_bytes"]:>10}')
+
+
+def check_sizes(send, cases):
+    # Payload size regression check: every scenario once, largest response per callback against its budget
+    largest = defaultdict(int)
+    for name, payload in cases:
+        largest[name] = max(largest[name], send(payload))
+    failed = False
+    for name, size in sorted(largest.items()):
+        budget = PAYLOAD_BUDGETS.get(name)
+        status = 'ok' if budget is None or size <= budget else 'OVER BUDGET'
+        failed = failed or status != 'ok'
+        print(f'{name:<20} {size:>10} bytes  (budget {budget})  {status}')
+    return not failed
+
+
+#-------------***** Startup time *****-----------------
+
+# Run in a fresh interpreter: time from importing the app to the first layout and callback response
+STARTUP_PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.server.test_client()
+assert client.get('/_dash-layout').status_code == 200
+assert client.post('/_dash-update-component', json=json.loads(sys.argv[1])).status_code == 200
+print(json.dumps({'import_s': imported - start, 'first_response_s': time.perf_counter() - start}))
+'''
+
+
+def startup(data, runs):
+    # Cold starts parsing the CSV (no snapshot) against starts mapping the startup snapshot
+    root = os.path.dirname(os.path.abspath(__file__))
+    directory = tempfile.mkdtemp()
+    try:
+        csv = shutil.copy(data, directory)
+        payload = json.dumps(callback_payload('line-chart.figure', [('country-dropdown-line', 'value', ['Germany', 'United States', 'China'])]))
+        report = {}
+        for mode, snapshot in (('csv', '0'), ('snapshot', '1')):
+            env = dict(os.environ, GDP_DATA_FILE=csv, DATA_SNAPSHOT=snapshot)
+            env.pop('FIGURE_CACHE_DB', None)
+            if snapshot == '1':  # the first start writes the snapshot
+                subprocess.run([sys.executable, '-c', STARTUP_PROBE, payload], env=env, check=True, capture_output=True, cwd=root)
+            samples = []
+            for _ in range(runs):
+                out = subprocess.run([sys.executable, '-c', STARTUP_PROBE, payload], env=env, check=True,
+                                     capture_output=True, text=True, cwd=root)
+                samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+            report[mode] = {key: float(np.median([s[key] for s in samples])) for key in samples[0]}
+        return report
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the dashboard callbacks.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    synth = commands.add_parser('synth', help='generate a synthetic dataset with the CSV schema')
+    synth.add_argument('--entities', type=int, default=10000)
+    synth.add_argument('--periods', type=int, default=300)
+    synth.add_argument('--seed', type=int, default=0)
+    synth.add_argument('--output', default='synthetic_gdp_per_capita.csv')
+
+    bench = commands.add_parser('run', help='replay callback requests and report latency percentiles')
+    bench.add_argument('--data', help='dataset CSV to serve (default: GDP_DATA_FILE or the bundled CSV)')
+    bench.add_argument('--url', help='benchmark a running server instead of an in-process app')
+    bench.add_argument('--requests', type=int, default=500, help='total number of requests')
+    bench.add_argument('--concurrency', type=int, default=8)
+    bench.add_argument('--seed', type=int, default=0)
+    bench.add_argument('--json', help='also write the report to this file')
+
+    commands.add_parser('sizes', help='check callback response sizes against PAYLOAD_BUDGETS (exit status 1 on regression)')
+
+    start = commands.add_parser('startup', help='median import-to-first-response time, with and without the startup snapshot')
+    start.add_argument('--data', default=os.environ.get('GDP_DATA_FILE', 'gdp_per_capita_1990_2020.csv'))
+    start.add_argument('--runs', type=int, default=5)
+
+    args = parser.parse_args()
+
+    if args.command == 'synth':
+        synthesize(args.output, args.entities, args.periods, seed=args.seed)
+        print(f'Wrote {args.entities} entities x {args.periods} periods to {args.output}')
+        return
+
+    if args.command == 'sizes':
+        import app
+        cases = scenarios(app.live_store.current, len(app.slider_years(app.live_store.current)))
+        raise SystemExit(0 if check_sizes(local_sender(), cases) else 1)
+
+    if args.command == 'startup':
+        for mode, r in startup(args.data, args.runs).items():
+            print(f'{mode:<10} import {r["import_s"] * 1000:>7.0f} ms   first response {r["first_response_s"] * 1000:>7.0f} ms')
+        return
+
+    if args.data:
+        os.environ['GDP_DATA_FILE'] = args.data
+    # The payloads are drawn from the same dataset the server is expected to serve
+    import app
+    cases = scenarios(app.live_store.current, len(app.slider_years(app.live_store.current)), seed=args.seed)
+    send = remote_sender(args.url) if args.url else local_sender()
+
+    results, wall = run(send, cases, args.requests, args.concurrency)
+    report = summarize(results, wall)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; cross-process coalescing is then off
+    fcntl = None
+
+# Number of lock files keys are spread over when coalescing across processes
+LOCK_STRIPES = 256
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent computations of the same key.
+
+    While a computation for a key is running, other threads asking for the
+    same key wait for it and get its result instead of starting their own.
+    With a lock directory, the computing thread also holds a file lock for
+    the key, so workers on the same host take turns; the computation passed
+    in should then first look for a result another worker has just stored.
+    """
+
+    def __init__(self, lock_dir=None):
+        self.lock_dir = lock_dir if fcntl is not None else None
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+        self.computations = 0
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._held = threading.local()  # stripes whose file lock this thread holds
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.computations += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            with self._process_lock(key):
+                call.result = func()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    @contextmanager
+    def _process_lock(self, key):
+        if not self.lock_dir:
+            yield
+            return
+        stripe = int(hashlib.sha1(repr(key).encode()).hexdigest(), 16) % LOCK_STRIPES
+        held = self._held.__dict__.setdefault('stripes', set())
+        if stripe in held:
+            # A computation nested in one whose key shares the stripe: locking the file again
+            # through a new descriptor would wait for this very thread
+            yield
+            return
+        with open(os.path.join(self.lock_dir, f'{stripe:03d}.lock'), 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            held.add(stripe)
+            try:
+                yield
+            finally:
+                held.discard(stripe)
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def stats(self):
+        with self._lock:
+            return {'computations': self.computations, 'coalesced': self.coalesced, 'in_flight': len(self._calls)}
@@ -0,0 +1,83 @@
+import base64
+import json
+import os
+
+import numpy as np
+import plotly
+
+# Compact payload mode: figure arrays are rounded to the precision the dashboard displays
+COMPACT_PAYLOADS = os.environ.get('COMPACT_PAYLOADS', '1') != '0'
+
+# Typed arrays ({dtype, bdata} base64 blocks, plotly.js 2.28+) are opt-in. Base64 costs ~5.3 bytes
+# per 32-bit value, about what a rounded GDP value or growth rate takes as JSON text, so they only
+# pay off for long arrays and are used only where they come out smaller than the plain list.
+_PLOTLY_ENCODES_ARRAYS = int(plotly.__version__.split('.')[0]) >= 6
+BINARY_ARRAYS = os.environ.get('COMPACT_BINARY_ARRAYS', '0') != '0'
+BINARY_MIN_LENGTH = 256
+
+
+def array(values, decimals=0):
+    # Figure data array rounded to `decimals` places, as a plain list or (opt-in) a typed array
+    values = np.asarray(values, dtype=np.float64)
+    if not COMPACT_PAYLOADS:
+        return values
+    values = np.round(values, decimals)
+    missing = np.isnan(values)
+
+    # Whole numbers without gaps fit in 32-bit integers, everything else in 32-bit floats
+    if decimals <= 0 and not missing.any() and np.abs(values).max(initial=0) < 2 ** 31:
+        typed = values.astype(np.int32)
+    else:
+        typed = values.astype(np.float32)
+
+    # Plain JSON lists: integers print without a fraction, and rounded floats with few digits
+    if typed.dtype.kind == 'i':
+        listed = typed.tolist()
+    else:
+        listed = [None if m else v for m, v in zip(missing, values.tolist())]
+
+    if BINARY_ARRAYS and typed.size >= BINARY_MIN_LENGTH:
+        bdata = base64.b64encode(typed.tobytes()).decode()
+        if len(bdata) + 30 < len(json.dumps(listed)):  # 30: the {"dtype": ..., "bdata": ...} wrapper
+            # plotly.py 6+ writes numpy arrays as typed arrays itself
+            return typed if _PLOTLY_ENCODES_ARRAYS else {'dtype': typed.dtype.str[1:], 'bdata': bdata}
+    return listed
+
+
+def x_values(labels):
+    # Trace x arguments for year labels: consecutive integer years are sent as x0/dx instead of an array per trace
+    if COMPACT_PAYLOADS and labels:
+        try:
+            years = [int(label) for label in labels]
+        except ValueError:
+            years = None
+        if years == list(range(years[0], years[0] + len(years))) if years else False:
+            return {'x0': years[0], 'dx': 1}
+    return {'x': labels}
+
+
+# Subplot types whose template defaults are dropped unless a trace of the figure draws on them
+_SUBPLOT_TRACES = {
+    'geo': ('choropleth', 'scattergeo'),
+    'scene': ('scatter3d', 'surface', 'mesh3d', 'cone', 'streamtube', 'volume', 'isosurface'),
+    'polar': ('scatterpolar', 'scatterpolargl', 'barpolar'),
+    'ternary': ('scatterternary',),
+    'mapbox': ('scattermapbox', 'choroplethmapbox', 'densitymapbox'),
+    'map': ('scattermap', 'choroplethmap', 'densitymap'),
+}
+
+
+def figure(fig):
+    # Keep only the parts of the figure's template that apply to its own trace types.
+    # The default template carries styling for every trace type, about half of a small figure's JSON.
+    if not COMPACT_PAYLOADS:
+        return fig
+    used = {trace.type for trace in fig.data}
+    template = fig.layout.template.to_plotly_json()
+    template['data'] = {k: v for k, v in template.get('data', {}).items() if k in used}
+    layout = template.get('layout', {})
+    for subplot, trace_types in _SUBPLOT_TRACES.items():
+        if used.isdisjoint(trace_types):
+            layout.pop(subplot, None)
+    fig.layout.template = template
+    return fig
@@ -0,0 +1,406 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+COUNTRY_COLUMN = 'Country '
+CODE_COLUMN = 'Country Code'
+
+# Matrices derived from the values, stored next to them in the binary format
+DERIVED_ARRAYS = ('growth', 'log_levels', 'order', 'ranks', 'ranked')
+
+
+def dataset_version(path):
+    # Short content hash of the source file, used to tell dataset versions apart
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def period_position(label):
+    # Position of a period label in years: '2020' -> 2020, '2020Q3' or '2020-Q3' -> 2020.5,
+    # '2020-07' -> 2020.5; NaN for labels it doesn't recognize
+    match = re.fullmatch(r'(\d{4})(?:-?Q([1-4])|-(\d{2}))?', str(label).strip())
+    if match is None:
+        return float('nan')
+    year, quarter, month = match.groups()
+    if quarter:
+        return int(year) + (int(quarter) - 1) / 4
+    if month:
+        return int(year) + (int(month) - 1) / 12
+    return float(year)
+
+
+def store_path(csv_path):
+    # Directory holding the binary form of a CSV file: <name>.store next to it
+    return os.path.splitext(csv_path)[0] + '.store'
+
+
+# Unpublished or superseded store directories are removed once they are this old (seconds),
+# so a concurrent writer's directory is never deleted before it publishes it
+STORE_GRACE_SECONDS = 600
+
+
+def _publish(directory, target):
+    # Point the <directory> symlink at the finished store <target> in one atomic rename
+    previous = os.path.realpath(directory) if os.path.islink(directory) else None
+    parent, name = os.path.split(target)
+    link = os.path.join(parent, name.replace('.v-', '.link-', 1))
+    os.symlink(name, link)
+    if os.path.isdir(directory) and not os.path.islink(directory):
+        shutil.rmtree(directory)  # a plain directory written by an older version of save()
+    os.replace(link, directory)
+
+    # Clean up old versions; the previous one is kept for readers that resolved the link just before
+    prefix = os.path.basename(directory)
+    for entry in os.listdir(parent):
+        path = os.path.join(parent, entry)
+        if not entry.startswith((prefix + '.v-', prefix + '.tmp-')) or path in (target, previous):
+            continue
+        try:
+            if time.time() - os.stat(path).st_mtime > STORE_GRACE_SECONDS:
+                shutil.rmtree(path, ignore_errors=True)
+        except FileNotFoundError:
+            pass
+
+
+class DataStore:
+    """Country x year matrix of GDP per capita with name/code and year lookups.
+
+    Missing observations are kept as NaN; views that display them as zero
+    do so on their own slices.
+    """
+
+    def __init__(self, countries, codes, years, values, version=None, derived=None, base=None):
+        self.version = version
+        self.countries = np.asarray(countries, dtype=object)
+        self.codes = np.asarray(codes, dtype=object)
+        self.years = [str(year) for year in years]
+        self.values = np.ascontiguousarray(values, dtype=np.float64)
+
+        # Row lookup by country name or ISO-3 code, column lookup by year label
+        self.row_index = {name: i for i, name in enumerate(self.countries)}
+        self.row_index.update({code: i for i, code in enumerate(self.codes)})
+        self.year_index = {year: j for j, year in enumerate(self.years)}
+        # Time between columns, in years; columns need not be consecutive or annual
+        self.positions = np.array([period_position(year) for year in self.years], dtype=np.float64)
+
+        # Derived matrices, computed once per dataset in a single vectorized pass
+        # unless they come precomputed from the binary format, or can be updated
+        # from a previous version (base) by recomputing only what depends on changed cells
+        if derived is None and base is not None:
+            derived = self._update_derived(base)
+        if derived is None:
+            derived = dict(zip(DERIVED_ARRAYS, self._growth_matrices(self.values) + self._rank_matrices(self.values)))
+        for name in DERIVED_ARRAYS:
+            setattr(self, name, derived[name])
+
+    @staticmethod
+    def _growth_matrices(values):
+        # Year-over-year growth in percent; NaN wherever either year is missing or the base is not positive
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_levels = np.log(np.where(values > 0, values, np.nan))
+            growth = np.expm1(np.diff(log_levels, axis=1)) * 100
+        return growth, log_levels
+
+    @staticmethod
+    def _rank_matrices(values):
+        # Per-year order from highest to lowest value (missing values last),
+        # each country's 1-based rank in it and the number of countries with data
+        order = np.argsort(-values, axis=0, kind='stable')
+        ranks = np.empty_like(order)
+        np.put_along_axis(ranks, order, np.arange(1, len(values) + 1)[:, None], axis=0)
+        ranked = np.count_nonzero(~np.isnan(values), axis=0)
+        return order, ranks, ranked
+
+    def _update_derived(self, base):
+        # Only for the common case of revised values and/or years appended, with the same countries
+        old = len(base.years)
+        if (old == 0 or base.years != self.years[:old] or len(base.countries) != len(self.countries)
+                or (base.countries != self.countries).any()):
+            return None
+
+        changed = np.ones(self.values.shape, dtype=bool)
+        changed[:, :old] = _cells_differ(base.values, self.values[:, :old])
+
+        # Log levels of the changed cells, growth of the year pairs touching one
+        log_levels = np.empty_like(self.values)
+        log_levels[:, :old] = base.log_levels
+        growth = np.empty((len(self.values), len(self.years) - 1))
+        growth[:, :old - 1] = base.growth
+        rows, cols = np.nonzero(changed)
+        values = self.values[rows, cols]
+        affected_rows, affected_cols = np.nonzero(changed[:, 1:] | changed[:, :-1])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_levels[rows, cols] = np.log(np.where(values > 0, values, np.nan))
+            growth[affected_rows, affected_cols] = np.expm1(
+                log_levels[affected_rows, affected_cols + 1] - log_levels[affected_rows, affected_cols]) * 100
+
+        # Rankings of the years with a changed cell
+        order = np.empty(self.values.shape, dtype=base.order.dtype)
+        ranks = np.empty(self.values.shape, dtype=base.ranks.dtype)
+        ranked = np.empty(len(self.years), dtype=base.ranked.dtype)
+        order[:, :old], ranks[:, :old], ranked[:old] = base.order, base.ranks, base.ranked
+        columns = np.flatnonzero(changed.any(axis=0))
+        order[:, columns], ranks[:, columns], ranked[columns] = self._rank_matrices(self.values[:, columns])
+
+        return {'growth': growth, 'log_levels': log_levels, 'order': order, 'ranks': ranks, 'ranked': ranked}
+
+    @classmethod
+    def from_frame(cls, frame, version=None, base=None):
+        years = [column for column in frame.columns if column not in (COUNTRY_COLUMN, CODE_COLUMN)]
+        return cls(
+            countries=frame[COUNTRY_COLUMN].to_numpy(),
+            codes=frame[CODE_COLUMN].to_numpy(),
+            years=years,
+            values=frame[years].to_numpy(dtype=np.float64),
+            version=version,
+            base=base,
+        )
+
+    @classmethod
+    def from_csv(cls, path, base=None):
+        # pandas is only needed on the text path, so it is imported here
+        import pandas as pd
+        return cls.from_frame(pd.read_csv(path), version=dataset_version(path), base=base)
+
+    def save(self, directory, source=None):
+        # Write the matrices as .npy files plus a JSON sidecar with the labels.
+        # Each write builds its own versioned directory next to the target; <directory> is a symlink
+        # swapped to it atomically, so readers never see a partial store and writers never collide.
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix=os.path.basename(directory) + '.tmp-', dir=parent)
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp, 0o777 & ~umask)  # mkdtemp makes it private; readable like the files in it instead
+        for name in ('values',) + DERIVED_ARRAYS:
+            np.save(os.path.join(tmp, name + '.npy'), np.ascontiguousarray(getattr(self, name)))
+        meta = {
+            'version': self.version,
+            'countries': self.countries.tolist(),
+            'codes': self.codes.tolist(),
+            'years': self.years,
+        }
+        if source is not None:
+            stat = os.stat(source)
+            meta['source'] = {'path': os.path.basename(source), 'size': stat.st_size, 'mtime': stat.st_mtime}
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        target = os.path.join(parent, os.path.basename(tmp).replace('.tmp-', '.v-', 1))
+        os.rename(tmp, target)
+        _publish(os.path.abspath(directory), target)
+
+    @classmethod
+    def open(cls, directory):
+        # Memory-map a store written by save(); pages are read on demand and shared between processes.
+        # The link is resolved once, so all files come from the same version even if it is swapped meanwhile.
+        directory = os.path.realpath(directory)
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+
+        def load(name):
+            return np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+
+        return cls(
+            countries=meta['countries'],
+            codes=meta['codes'],
+            years=meta['years'],
+            values=load('values'),
+            version=meta['version'],
+            derived={name: load(name) for name in DERIVED_ARRAYS},
+        )
+
+    def rows(self, keys):
+        # Row numbers for the given country names/codes, in the given order; unknown keys are skipped
+        index = self.row_index
+        return np.fromiter((index[key] for key in keys or () if key in index), dtype=np.intp)
+
+    def col(self, year):
+        return self.year_index[str(year)]
+
+    def column(self, year):
+        return self.values[:, self.col(year)]
+
+    def top(self, year, n=10, page=1):
+        # Rows of the n countries on the given 1-based page of the ranking for a year
+        start = (page - 1) * n
+        return self.order[start:start + n, self.col(year)]
+
+    def rank(self, country, year):
+        # (rank, percentile) of a country in a year, or None if it has no value that year.
+        # The percentile is the share of ranked countries with a lower value.
+        row, j = self.row_index[country], self.col(year)
+        if np.isnan(self.values[row, j]):
+            return None
+        rank = int(self.ranks[row, j])
+        return rank, float(100 * (self.ranked[j] - rank) / self.ranked[j])
+
+    def cagr(self, start, end):
+        # Compound annual growth rate in percent between two years, for all countries at once.
+        # Differences of log levels are cumulative log growth, so this is O(1) in the number of years.
+        # It is annualized over the time between the two periods, not the number of columns.
+        a, b = self.col(start), self.col(end)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.expm1((self.log_levels[:, b] - self.log_levels[:, a]) / (self.positions[b] - self.positions[a])) * 100
+
+
+def _cells_differ(a, b):
+    # Element-wise "changed" for two equally shaped matrices, where NaN equals NaN
+    return ~((a == b) | (np.isnan(a) & np.isnan(b)))
+
+
+# Changes between two dataset versions: the years and the countries with a changed, added or
+# removed value, and whether the set or order of countries (rows) or years (columns) changed
+DatasetDiff = namedtuple('DatasetDiff', 'years countries rows_changed columns_changed')
+
+
+def diff(old, new):
+    countries = [c for c in new.countries if c in old.row_index]
+    years = [y for y in new.years if y in old.year_index]
+    differ = _cells_differ(
+        old.values[np.ix_([old.row_index[c] for c in countries], [old.year_index[y] for y in years])],
+        new.values[np.ix_([new.row_index[c] for c in countries], [new.year_index[y] for y in years])],
+    )
+    return DatasetDiff(
+        years={y for y, d in zip(years, differ.any(axis=0)) if d} | (set(old.years) ^ set(new.years)),
+        countries={c for c, d in zip(countries, differ.any(axis=1)) if d} | (set(old.countries) ^ set(new.countries)),
+        rows_changed=list(old.countries) != list(new.countries),
+        columns_changed=old.years != new.years,
+    )
+
+
+def _is_current(directory, csv_path):
+    # A binary store is used when it was built from the CSV as it is now (or the CSV is gone)
+    meta_path = os.path.join(directory, 'meta.json')
+    if not os.path.exists(meta_path):
+        return False
+    if not os.path.exists(csv_path):
+        return True
+    with open(meta_path) as f:
+        source = json.load(f).get('source')
+    stat = os.stat(csv_path)
+    return source is not None and source['size'] == stat.st_size and source['mtime'] == stat.st_mtime
+
+
+def _source_stat(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime
+
+
+def load_store(csv_path, base=None, snapshot=False):
+    # Memory-map the ingested binary store if it is up to date, otherwise parse the CSV.
+    # With snapshot, a parsed CSV is also written as the binary store, so the next start maps it directly.
+    directory = store_path(csv_path)
+    if _is_current(directory, csv_path):
+        return DataStore.open(directory)
+    source = _source_stat(csv_path)
+    store = DataStore.from_csv(csv_path, base=base)
+    if snapshot and _source_stat(csv_path) == source:  # not if the file changed while it was parsed
+        try:
+            store.save(directory, source=csv_path)
+        except OSError as error:
+            logger.warning('Could not write the startup snapshot %s: %s', directory, error)
+    return store
+
+
+# Longest wait between retries of a failed reload (seconds)
+RELOAD_RETRY_MAX_SECONDS = 300
+
+
+class LiveStore:
+    """The current version of the dataset, swapped atomically when the source file changes.
+
+    A new version is loaded next to the current one and published with a
+    single reference assignment. Readers take `current` once per request and
+    use that object throughout, so they never see a half-updated dataset.
+    Listeners registered with on_swap(old, new, diff) invalidate whatever
+    was derived from the changed cells.
+    """
+
+    def __init__(self, path, snapshot=False):
+        # snapshot applies to the initial load only: on a reload every worker would parse
+        # the CSV and write the same store at once
+        self.path = path
+        self.current = load_store(path, snapshot=snapshot)
+        self._listeners = []
+        self._reload_lock = threading.Lock()
+        self._signature = self._source_signature()
+        self._watcher = None
+        self._watcher_lock = threading.Lock()
+
+    def on_swap(self, listener):
+        self._listeners.append(listener)
+        return listener
+
+    def _source_signature(self):
+        # Size and modification time of the CSV and of the ingested store's sidecar
+        signature = []
+        for path in (self.path, os.path.join(store_path(self.path), 'meta.json')):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def reload(self):
+        # Load the source again and swap it in if its content changed; returns the DatasetDiff or None
+        with self._reload_lock:
+            signature = self._source_signature()
+            old = self.current
+            new = load_store(self.path, base=old)
+            self._signature = signature  # only once loaded, so a failed reload is retried
+            if new.version == old.version:
+                return None
+            changes = diff(old, new)
+            self.current = new
+            for listener in self._listeners:
+                listener(old, new, changes)
+            logger.info('Dataset %s: version %s -> %s, %d years and %d countries changed',
+                        self.path, old.version, new.version, len(changes.years), len(changes.countries))
+            return changes
+
+    def watch(self, interval):
+        # Poll the source from a daemon thread of this process. Threads don't survive a fork,
+        # so this is called in every worker; it is a no-op once the watcher runs in the process.
+        with self._watcher_lock:
+            if self._watcher is not None and self._watcher[0] == os.getpid():
+                return
+            self._watcher = (os.getpid(), None)
+
+        def run():
+            pending, failures, delay = None, 0, interval
+            while True:
+                time.sleep(delay)
+                delay = interval
+                signature = self._source_signature()
+                if signature == self._signature:
+                    pending = None
+                elif signature != pending:
+                    pending = signature  # reload once the file has stopped changing for one interval
+                else:
+                    try:
+                        self.reload()
+                        failures = 0
+                    except Exception:
+                        # Retried with exponential backoff until it succeeds or the file changes again
+                        failures += 1
+                        delay = min(interval * 2 ** failures, RELOAD_RETRY_MAX_SECONDS)
+                        logger.exception('Reloading %s failed, retrying in %g s', self.path, delay)
+
+        thread = threading.Thread(target=run, name='dataset-watcher', daemon=True)
+        thread.start()
+        self._watcher = (os.getpid(), thread)
@@ -0,0 +1,225 @@
+import argparse
+import hashlib
+import html
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Country sets exported when no --selections file is given (the dashboard's default selection)
+DEFAULT_SELECTIONS = {'default': ['Germany', 'United States', 'China']}
+
+INDEX_FILE = 'index.json'
+
+
+#-------------***** Views *****-----------------
+
+class View:
+    """One exported view: what to render, and a hash of everything its content depends on."""
+
+    def __init__(self, path, kind, args, label, inputs):
+        self.path = path
+        self.kind = kind
+        self.args = args
+        self.label = label
+        self.inputs = inputs
+
+    def digest(self, code_version):
+        h = hashlib.sha1(code_version.encode())
+        h.update(repr((self.path, self.kind, self.args)).encode())
+        for part in self.inputs:
+            h.update(part if isinstance(part, bytes) else repr(part).encode())
+        return h.hexdigest()
+
+
+def code_version():
+    # The app's render fingerprint (rendering code, library versions and settings such as
+    # COMPACT_PAYLOADS) plus this file; a change to any of them regenerates every view
+    import app
+    h = hashlib.sha1(app.render_fingerprint().encode())
+    with open(os.path.abspath(__file__), 'rb') as f:
+        h.update(f.read())
+    return h.hexdigest()
+
+
+def list_views(store, selections, table_sizes):
+    # Every choropleth and top-N table by year, and the line/growth/bar charts of every country set.
+    # The inputs are the slices of the dataset each view is drawn from.
+    countries = store.countries.tolist()
+    views = []
+    for year in store.years:
+        column = store.column(year).tobytes()
+        views.append(View(f'choropleth/{year}', 'choropleth', (year,), f'Choropleth {year}',
+                          [column, store.codes.tolist(), countries]))
+        for size in table_sizes:
+            views.append(View(f'table/{year}-top{size}', 'table', (year, size), f'Top {size} countries {year}',
+                              [column, store.codes.tolist(), countries]))
+
+    for name, selection in selections.items():
+        rows = store.rows(selection)
+        names = store.countries[rows].tolist()
+        series = [store.values[rows].tobytes(), names, store.years]
+        views.append(View(f'line/{name}', 'line', (tuple(selection),), f'GDP per capita: {name}', series))
+        views.append(View(f'growth/{name}', 'growth', (tuple(selection),), f'Growth rate: {name}', series))
+        for year in store.years:
+            views.append(View(f'bar/{name}/{year}', 'bar', (tuple(selection), year), f'{name} in {year}',
+                              [store.values[rows, store.col(year)].tobytes(), names]))
+    return views
+
+
+#-------------***** Rendering (worker processes) *****-----------------
+
+def render(kind, args):
+    # JSON and standalone HTML of one view, computed in a pool worker
+    import plotly.io
+    import plotly.utils
+    import app
+
+    store = app.live_store.current
+    if kind == 'table':
+        year, size = args
+        rows = store.top(year, size)
+        col = store.col(year)
+        entries = [
+            {'rank': int(store.ranks[row, col]), 'country': store.countries[row], 'code': store.codes[row],
+             'value': None if np.isnan(store.values[row, col]) else round(float(store.values[row, col]))}
+            for row in rows
+        ]
+        return json.dumps({'year': year, 'rows': entries}), table_html(year, entries)
+
+    # The figure builders, not the cached callbacks: a shared figure cache could hold other renderings
+    if kind == 'choropleth':
+        figure = app.choropleth_figure(store, *args)
+    elif kind == 'line':
+        figure = app.line_figure(store, list(args[0]))
+    elif kind == 'growth':
+        figure = app.growth_figure(store, list(args[0]))
+    else:
+        figure = app.bar_figure(store, list(args[0]), args[1])
+    payload = json.dumps(figure, cls=plotly.utils.PlotlyJSONEncoder)
+    return payload, plotly.io.to_html(json.loads(payload), include_plotlyjs='cdn', validate=False)
+
+
+def _render_view(view):
+    return view.path, render(view.kind, view.args)
+
+
+def table_html(year, entries):
+    body = ''.join(
+        '<tr><td>{}</td><td>{}</td><td>{}</td></tr>'.format(
+            e['rank'], html.escape(e['country']), 'n/a' if e['value'] is None else f'$ {e["value"]:,d}')
+        for e in entries
+    )
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>GDP per Capita {year}</title></head>'
+            f'<body><h5>GDP per Capita {year}</h5><table><thead><tr><th>Rank</th><th>Country</th>'
+            f'<th>GDP per Capita</th></tr></thead><tbody>{body}</tbody></table></body></html>')
+
+
+#-------------***** Output *****-----------------
+
+def _write(path, text):
+    # Written next to the target and renamed, so a CDN sync never picks up a partial file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(path + '.tmp', path)
+
+
+def _remove(output, path):
+    for extension in ('.json', '.html'):
+        try:
+            os.remove(os.path.join(output, path + extension))
+        except FileNotFoundError:
+            pass
+
+
+def index_html(store, views):
+    sections = {}
+    for view in views:
+        sections.setdefault(view.kind, []).append(
+            f'<li><a href="{html.escape(view.path)}.html">{html.escape(view.label)}</a> '
+            f'(<a href="{html.escape(view.path)}.json">json</a>)</li>')
+    body = ''.join(f'<h3>{kind}</h3><ul>{"".join(items)}</ul>' for kind, items in sections.items())
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>World GDP per Capita Dashboard</title></head>'
+            f'<body><h2>World GDP per Capita Dashboard</h2><p>Dataset version {store.version}</p>{body}</body></html>')
+
+
+def export(store, output, selections, table_sizes, workers=None, force=False):
+    # Render the views whose hash changed since the last export; returns (rendered, unchanged, removed)
+    version = code_version()
+    views = list_views(store, selections, table_sizes)
+    digests = {view.path: view.digest(version) for view in views}
+
+    index_path = os.path.join(output, INDEX_FILE)
+    previous = {}
+    if not force and os.path.exists(index_path):
+        with open(index_path) as f:
+            previous = {path: entry['hash'] for path, entry in json.load(f)['views'].items()}
+
+    stale = [
+        view for view in views
+        if previous.get(view.path) != digests[view.path]
+        or not all(os.path.exists(os.path.join(output, view.path + e)) for e in ('.json', '.html'))
+    ]
+    if stale:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for path, (payload, page) in pool.map(_render_view, stale, chunksize=max(1, len(stale) // 64)):
+                _write(os.path.join(output, path + '.json'), payload)
+                _write(os.path.join(output, path + '.html'), page)
+
+    removed = set(previous) - set(digests)
+    for path in removed:
+        _remove(output, path)
+
+    _write(os.path.join(output, 'index.html'), index_html(store, views))
+    _write(index_path, json.dumps({
+        'dataset_version': store.version,
+        'generated': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'views': {
+            view.path: {'kind': view.kind, 'label': view.label, 'hash': digests[view.path],
+                        'json': view.path + '.json', 'html': view.path + '.html'}
+            for view in views
+        },
+    }, indent=1))
+    return len(stale), len(views) - len(stale), len(removed)
+
+
+def load_selections(path):
+    # JSON object mapping a set name (used in file names) to a list of countries
+    with open(path) as f:
+        selections = json.load(f)
+    for name in selections:
+        if not re.fullmatch(r'[A-Za-z0-9_-]+', name):
+            raise SystemExit(f'{path}: country set name {name!r} may only contain letters, digits, "-" and "_"')
+    return selections
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-render the dashboard views as static JSON/HTML files.')
+    parser.add_argument('--data', help='dataset CSV (default: GDP_DATA_FILE or the bundled CSV)')
+    parser.add_argument('--output', default='site', help='output directory (default: site)')
+    parser.add_argument('--selections', help='JSON file mapping country set names to lists of countries')
+    parser.add_argument('--table-sizes', help='comma-separated top-N table sizes (default: the page sizes of the table)')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per core)')
+    parser.add_argument('--force', action='store_true', help='render every view, even if unchanged')
+    args = parser.parse_args()
+
+    if args.data:
+        os.environ['GDP_DATA_FILE'] = args.data
+    # Imported once here; the pool workers inherit (or import) the same dataset
+    import app
+
+    selections = load_selections(args.selections) if args.selections else DEFAULT_SELECTIONS
+    table_sizes = [int(size) for size in args.table_sizes.split(',')] if args.table_sizes else app.table_page_sizes
+    start = time.perf_counter()
+    rendered, unchanged, removed = export(
+        app.live_store.current, args.output, selections, table_sizes, workers=args.workers, force=args.force)
+    print(f'Rendered {rendered} views, {unchanged} unchanged, {removed} removed '
+          f'in {time.perf_counter() - start:.1f}s -> {args.output}/index.html')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+import functools
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import plotly.utils
+
+import metrics
+from coalesce import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+def _freeze(value):
+    # Make callback inputs hashable (dropdowns send lists)
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+class SQLiteCache:
+    """Serialized callback outputs in a SQLite file, shared by all worker processes on a host.
+
+    The file is only an optimisation: SQLite errors (a lock timeout, a full
+    disk, a read-only path) are logged and count as a miss or a skipped write.
+    Hits record their time in memory and write it in batches, so reads don't
+    take the database's write lock.
+    """
+
+    def __init__(self, path, maxsize=4096, touch_batch=64):
+        self.path = path
+        self.maxsize = maxsize
+        self.touch_batch = touch_batch
+        self.errors = 0
+        self._local = threading.local()
+        self._writes = 0
+        self._touched = {}
+        self._lock = threading.Lock()
+        self._failing = False
+        self._run(lambda db: db.execute(
+            'CREATE TABLE IF NOT EXISTS figures (key TEXT PRIMARY KEY, payload TEXT, used REAL)'))
+
+    def _connection(self):
+        # SQLite connections can't cross threads or forks, so each thread of each process opens its own
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    def _run(self, operation, default=None):
+        # operation(db), or default if SQLite fails; logged when the file starts and stops failing
+        try:
+            result = operation(self._connection())
+        except sqlite3.Error as error:
+            with self._lock:
+                self.errors += 1
+                failing, self._failing = self._failing, True
+            if not failing:
+                logger.warning('Shared figure cache %s unavailable, skipping it: %s', self.path, error)
+            return default
+        if self._failing:
+            self._failing = False
+            logger.info('Shared figure cache %s available again', self.path)
+        return result
+
+    @staticmethod
+    def _digest(key):
+        return hashlib.sha1(repr(key).encode()).hexdigest()
+
+    def get(self, key):
+        digest = self._digest(key)
+        row = self._run(lambda db: db.execute('SELECT payload FROM figures WHERE key = ?', (digest,)).fetchone())
+        if row is None:
+            return None
+        with self._lock:
+            self._touched[digest] = time.time()
+            full = len(self._touched) >= self.touch_batch
+        if full:
+            self._run(self._flush_touches)
+        return row[0]
+
+    def _flush_touches(self, db):
+        # Write the times of the hits recorded since the last flush in one transaction
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        if touched:
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                db.executemany('UPDATE figures SET used = ? WHERE key = ?',
+                               [(used, digest) for digest, used in touched.items()])
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+
+    def set(self, key, payload):
+        self._run(lambda db: db.execute(
+            'INSERT OR REPLACE INTO figures VALUES (?, ?, ?)', (self._digest(key), payload, time.time())))
+        # Trim the least recently used rows every so often rather than on every write
+        self._writes += 1
+        if self._writes % 64 == 0:
+            self._run(self._trim)
+
+    def _trim(self, db):
+        self._flush_touches(db)
+        db.execute(
+            'DELETE FROM figures WHERE key IN '
+            '(SELECT key FROM figures ORDER BY used DESC LIMIT -1 OFFSET ?)',
+            (self.maxsize,)
+        )
+
+    def clear(self):
+        with self._lock:
+            self._touched.clear()
+        self._run(lambda db: db.execute('DELETE FROM figures'))
+
+    def __len__(self):
+        return self._run(lambda db: db.execute('SELECT COUNT(*) FROM figures').fetchone()[0], default=0)
+
+
+class FigureCache:
+    """LRU cache of serialized callback outputs keyed by (callback, inputs, dataset version).
+
+    Cached callbacks take the current dataset version of a LiveStore once per
+    call, key by it and receive it as their first argument, so an output is
+    always stored under the version it was computed from.
+    An optional shared cache (e.g. SQLiteCache) is consulted on local misses,
+    so worker processes fill each other's caches. Misses go through a
+    SingleFlight, so identical concurrent requests are computed only once.
+    """
+
+    def __init__(self, live, maxsize=128, shared=None, flight=None, fingerprint=None):
+        self.live = live
+        self.maxsize = maxsize
+        self.version = live.current.version
+        self.shared = shared
+        # Identifies the code and settings outputs are rendered with; the shared cache outlives
+        # processes, so its keys include it and entries of other deployments never match
+        self.fingerprint = fingerprint
+        self.flight = flight if flight is not None else SingleFlight()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.late_hits = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._functions = {}
+        self._lock = threading.Lock()
+
+    def key(self, name, args, version):
+        return (name, _freeze(args), version)
+
+    def get(self, key):
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return payload
+
+        payload = self.shared.get((self.fingerprint,) + key) if self.shared is not None else None
+        with self._lock:
+            if payload is None:
+                self.misses += 1
+                return None
+            self.shared_hits += 1
+        self._store(key, payload)
+        return payload
+
+    def set(self, key, payload):
+        self._store(key, payload)
+        if self.shared is not None:
+            self.shared.set((self.fingerprint,) + key, payload)
+
+    def _store(self, key, payload):
+        with self._lock:
+            self._entries[key] = payload
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def rebase(self, version, keep):
+        # Switch to a new dataset version. Local entries of the old version for which
+        # keep(name, args) is true still hold and move to the new version; the rest are
+        # dropped. Shared entries are keyed by version, so old ones are simply no longer hit.
+        # Entries stored under the new version by requests that started after the swap are kept.
+        with self._lock:
+            entries, previous = self._entries, self.version
+            self._entries = OrderedDict(
+                ((name, args, version), payload)
+                for (name, args, entry_version), payload in entries.items()
+                if entry_version == version or (entry_version == previous and keep(name, args))
+            )
+            self.version = version
+            self.invalidations += len(entries) - len(self._entries)
+
+    def cached(self, name):
+        # Decorator for Dash callbacks: func(store, *inputs) is called with the dataset version the
+        # output is keyed by; the output is stored as JSON and handed back to Dash as plain data
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args):
+                # The dataset version is taken once, for both the key and the computation
+                store = self.live.current
+                key = self.key(name, args, store.version)
+                payload = self.get(key)
+                if payload is None:
+                    payload = self.flight.do(key, lambda: self._compute(key, func, (store,) + args))
+                metrics.observe_payload(len(payload))
+                return json.loads(payload)
+
+            self._functions[name] = wrapper
+            return wrapper
+
+        return decorator
+
+    def _compute(self, key, func, args):
+        # Run by a single thread per key. Another thread or worker may have stored the
+        # result between the miss and getting here, so look once more before computing.
+        payload = self._peek(key)
+        if payload is not None:
+            with self._lock:
+                self.late_hits += 1
+            return payload
+        result = func(*args)
+        with metrics.phase('serialize'):
+            payload = json.dumps(result, cls=plotly.utils.PlotlyJSONEncoder)
+        self.set(key, payload)
+        return payload
+
+    def _peek(self, key):
+        # Lookup that leaves the hit/miss counters alone
+        with self._lock:
+            payload = self._entries.get(key)
+        if payload is None and self.shared is not None:
+            payload = self.shared.get((self.fingerprint,) + key)
+            if payload is not None:
+                self._store(key, payload)
+        return payload
+
+    def warm(self, name, inputs):
+        # Precompute the outputs of a cached callback for every given tuple of inputs
+        wrapper = self._functions[name]
+        for args in inputs:
+            wrapper(*args)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            stats = {
+                'version': self.version,
+                'fingerprint': self.fingerprint,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'late_hits': self.late_hits,
+                'invalidations': self.invalidations,
+                'hit_ratio': (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+            }
+        if self.shared is not None:
+            stats['shared_size'] = len(self.shared)
+            stats['shared_errors'] = self.shared.errors
+        stats.update(self.flight.stats())
+        return stats
+
+
+def register_metrics(cache, registry):
+    # Expose the cache counters on the /metrics page
+    @registry.collector
+    def collect():
+        stats = cache.stats()
+        yield '# HELP figure_cache_lookups_total Figure cache lookups by result.'
+        yield '# TYPE figure_cache_lookups_total counter'
+        for result in ('hits', 'shared_hits', 'misses'):
+            yield f'figure_cache_lookups_total{{result="{result}"}} {stats[result]}'
+        yield '# HELP figure_cache_saved_computations_total Computations avoided by request coalescing.'
+        yield '# TYPE figure_cache_saved_computations_total counter'
+        yield f'figure_cache_saved_computations_total{{source="coalesced"}} {stats["coalesced"]}'
+        yield f'figure_cache_saved_computations_total{{source="late_hit"}} {stats["late_hits"]}'
+        yield '# HELP figure_cache_computations_total Callback outputs computed on a cache miss.'
+        yield '# TYPE figure_cache_computations_total counter'
+        yield f'figure_cache_computations_total {stats["computations"] - stats["late_hits"]}'
+        yield '# HELP figure_cache_invalidations_total Entries dropped because the dataset changed under them.'
+        yield '# TYPE figure_cache_invalidations_total counter'
+        yield f'figure_cache_invalidations_total {stats["invalidations"]}'
+        yield '# HELP figure_cache_entries Entries in the in-process figure cache.'
+        yield '# TYPE figure_cache_entries gauge'
+        yield f'figure_cache_entries {stats["size"]}'
@@ -0,0 +1,20 @@
+import argparse
+
+from data_store import DataStore, store_path
+
+
+# Convert the CSV dataset into the memory-mapped binary store read by the app
+def main():
+    parser = argparse.ArgumentParser(description='Convert a GDP per capita CSV file into a binary, memory-mappable store.')
+    parser.add_argument('csv', nargs='?', default='gdp_per_capita_1990_2020.csv', help='source CSV file')
+    parser.add_argument('--output', help='store directory (default: <csv name>.store next to the CSV)')
+    args = parser.parse_args()
+
+    output = args.output or store_path(args.csv)
+    store = DataStore.from_csv(args.csv)
+    store.save(output, source=args.csv)
+    print(f'Wrote {len(store.countries)} countries x {len(store.years)} years to {output} (version {store.version})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _Tally, deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Bucket upper bounds for callback phase durations (seconds) and payload sizes (bytes)
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BYTES_BUCKETS = (1e3, 3e3, 1e4, 3e4, 1e5, 3e5, 1e6, 3e6, 1e7)
+
+# Seconds between the snapshots each process writes to a shared metrics directory
+SHARE_INTERVAL = 5
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('{}="{}"'.format(n, str(v).replace('\\', r'\\').replace('"', r'\"')) for n, v in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _number(value):
+    return '+Inf' if value == float('inf') else repr(float(value))
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[n] for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def lines(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                labels = _labels(self.labelnames + ('le',), key + (_number(bound),))
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}'
+            yield f'{self.name}_count{_labels(self.labelnames, key)} {count}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[n] for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def lines(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f'{self.name}{_labels(self.labelnames, key)} {_number(value)}'
+
+
+class Registry:
+    """Metrics rendered in the Prometheus text exposition format.
+
+    Besides histograms and counters, collectors (functions returning
+    exposition lines) can be registered for values kept elsewhere.
+
+    With a shared directory (see share()), every process writes its values
+    there and render() returns the sum over all processes, so a scrape that
+    reaches any worker sees the totals of the whole server.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self.directory = None
+        self.interval = SHARE_INTERVAL
+        self._writer = None
+        self._lock = threading.Lock()
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, func):
+        self._collectors.append(func)
+        return func
+
+    def share(self, directory, interval=SHARE_INTERVAL):
+        # Aggregate over the processes that write snapshots to <directory>/<pid>.prom
+        os.makedirs(directory, exist_ok=True)
+        self.directory, self.interval = directory, interval
+
+    def start(self):
+        # Write this process's snapshot every interval from a daemon thread. Threads don't survive
+        # a fork, so this is called in every worker; it is a no-op once the writer runs in the process.
+        if self.directory is None:
+            return
+        with self._lock:
+            if self._writer == os.getpid():
+                return
+            self._writer = os.getpid()
+        threading.Thread(target=self._write_periodically, name='metrics-writer', daemon=True).start()
+
+    def _write_periodically(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self._write_snapshot()
+            except OSError as error:
+                logger.warning('Could not write the metrics snapshot to %s: %s', self.directory, error)
+
+    def _write_snapshot(self):
+        path = os.path.join(self.directory, f'{os.getpid()}.prom')
+        text = self.render_local()
+        with self._lock:
+            with open(path + '.tmp', 'w') as f:
+                f.write(text)
+            os.replace(path + '.tmp', path)
+
+    def render_local(self):
+        # The values of this process only
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.lines())
+        for collect in self._collectors:
+            lines.extend(collect())
+        return '\n'.join(lines) + '\n'
+
+    def render(self):
+        if self.directory is None:
+            return self.render_local()
+        self._write_snapshot()
+        snapshots = []
+        for entry in sorted(os.listdir(self.directory)):
+            pid, extension = os.path.splitext(entry)
+            if extension != '.prom' or not pid.isdigit():
+                continue
+            try:
+                with open(os.path.join(self.directory, entry)) as f:
+                    snapshots.append((int(pid), f.read()))
+            except FileNotFoundError:
+                pass
+        return merge(snapshots)
+
+
+def _running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def merge(snapshots):
+    # Sum the samples with the same name and labels over the (pid, exposition text) snapshots.
+    # Counters and histograms of exited workers still count, so totals never go down;
+    # gauges only count for the processes still running.
+    families = {}
+    for pid, text in snapshots:
+        running = None
+        family = None
+        for line in text.splitlines():
+            if line.startswith('# HELP '):
+                family = families.setdefault(line.split(' ', 3)[2], {'help': line, 'type': None, 'samples': {}})
+            elif line.startswith('# TYPE '):
+                family['type'] = line.rsplit(' ', 1)[1]
+            elif line and family is not None:
+                if family['type'] == 'gauge':
+                    if running is None:
+                        running = _running(pid)
+                    if not running:
+                        continue
+                sample, value = line.rsplit(' ', 1)
+                family['samples'][sample] = family['samples'].get(sample, 0.0) + float(value)
+
+    lines = []
+    for name, family in families.items():
+        lines.append(family['help'])
+        lines.append(f'# TYPE {name} {family["type"]}')
+        lines.extend(f'{sample} {_number(value)}' for sample, value in family['samples'].items())
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+callback_seconds = registry.histogram(
+    'dash_callback_seconds', 'Time spent in each phase of a Dash callback.', ('callback', 'phase'))
+payload_bytes = registry.histogram(
+    'dash_callback_payload_bytes', 'Size of the serialized callback output.', ('callback',), BYTES_BUCKETS)
+
+# Callback id of the instrumented callback running on the current thread
+_current = threading.local()
+
+
+@contextmanager
+def phase(name):
+    # Time a phase (e.g. select, build, serialize) of the callback running on this thread
+    callback = getattr(_current, 'callback', None)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if callback is not None:
+            callback_seconds.observe(time.perf_counter() - start, callback=callback, phase=name)
+
+
+def observe_payload(size):
+    callback = getattr(_current, 'callback', None)
+    if callback is not None:
+        payload_bytes.observe(size, callback=callback)
+
+
+#-------------***** Sampling profiler *****-----------------
+
+# Opt-in: with DASH_PROFILING=1, requests sent with an "X-Profile: 1" header are profiled
+PROFILING_ENABLED = os.environ.get('DASH_PROFILING', '') not in ('', '0')
+
+# Most recent profiles as (callback id, {collapsed stack: samples})
+recent_profiles = deque(maxlen=20)
+
+
+class SamplingProfiler:
+    """Samples the stack of one thread at a fixed interval from a background thread.
+
+    Stacks are collapsed into "outer;...;inner" strings, the input format of
+    flamegraph tools.
+    """
+
+    def __init__(self, thread_id, interval=0.002):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = _Tally()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _profile_requested():
+    if not PROFILING_ENABLED:
+        return False
+    import flask
+    return flask.has_request_context() and flask.request.headers.get('X-Profile') == '1'
+
+
+def render_profiles():
+    lines = []
+    for callback, samples in recent_profiles:
+        lines.append(f'# {callback}')
+        lines.extend(f'{stack} {count}' for stack, count in samples.most_common())
+    return '\n'.join(lines) + '\n'
+
+
+def instrument(callback_id):
+    # Decorator for Dash callbacks: records the total time and makes phase() attribute to this callback
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            previous = getattr(_current, 'callback', None)
+            _current.callback = callback_id
+            try:
+                if _profile_requested():
+                    with SamplingProfiler(threading.get_ident()) as profiler, phase('total'):
+                        result = func(*args)
+                    recent_profiles.append((callback_id, profiler.samples))
+                    return result
+                with phase('total'):
+                    return func(*args)
+            finally:
+                _current.callback = previous
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,69 @@
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from gunicorn.app.base import BaseApplication
+
+
+class DashboardServer(BaseApplication):
+    """Gunicorn application that imports the dashboard once in the master process.
+
+    The dataset and the warmed figure cache are loaded before the workers are
+    forked, so the workers share them copy-on-write instead of each loading
+    its own copy.
+    """
+
+    def __init__(self, options, warm=True):
+        self.options = options
+        self.warm = warm
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        import app
+        if self.warm:
+            app.warm_figure_cache()
+        return app.server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the dashboard with multiple gunicorn workers.')
+    parser.add_argument('--bind', default=os.environ.get('DASH_BIND', '0.0.0.0:8050'), help='address to listen on')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('DASH_WORKERS', multiprocessing.cpu_count())),
+                        help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('DASH_THREADS', 4)),
+                        help='threads per worker')
+    parser.add_argument('--cache-db', default=os.environ.get('FIGURE_CACHE_DB', os.path.join(tempfile.gettempdir(), 'gdp_dashboard_figures.sqlite')),
+                        help='SQLite file for the figure cache shared by the workers')
+    parser.add_argument('--lock-dir', default=os.environ.get('COALESCE_LOCK_DIR', os.path.join(tempfile.gettempdir(), 'gdp_dashboard_locks')),
+                        help='directory of lock files used to coalesce identical computations across workers')
+    parser.add_argument('--metrics-dir', default=os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'gdp_dashboard_metrics')),
+                        help='directory where the workers write their metrics, summed on /metrics')
+    parser.add_argument('--no-warm', action='store_true', help='skip precomputing the year-slider figures at startup')
+    args = parser.parse_args()
+
+    # Picked up by app.py when it is imported in the master process
+    os.environ['FIGURE_CACHE_DB'] = args.cache_db
+    os.environ['COALESCE_LOCK_DIR'] = args.lock_dir
+    os.environ['METRICS_DIR'] = args.metrics_dir
+
+    # Snapshots of a previous run would be added to the new totals
+    shutil.rmtree(args.metrics_dir, ignore_errors=True)
+
+    options = {
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'preload_app': True,
+        'accesslog': '-',
+    }
+    DashboardServer(options, warm=not args.no_warm).run()
+
+
+if __name__ == '__main__':
+    main()